@@ -169,6 +169,8 @@ class GaoLibInfoWidget(QtWidgets.QWidget, InfoWidget):
         self.bonesToBlend = None
         self.toggleAdditive = False
         self.pairWidgets = []
+        # full item json, only parsed when its data is needed
+        self.itemDict = None
         # utils.removeOrphans()
 
         # allow frame range in negative
@@ -345,8 +347,6 @@ class GaoLibInfoWidget(QtWidgets.QWidget, InfoWidget):
                     # Get tree item
                     treeModel = self.mainWindow.treeModel
                     treeItem = treeModel.getElemWithPath(oldPath)
-                selectedItemPath = self.mainWindow.currentTreeElement.path
-                expanded = self.mainWindow.getTreeExpandedItems()
                 # Modify folder name
                 if name != oldName:
                     # Rename folder
@@ -395,7 +395,7 @@ class GaoLibInfoWidget(QtWidgets.QWidget, InfoWidget):
                             "Impossible to rename folder",
                         )
                         raise
-                    if isFolder:
+                    if isFolder and treeItem is not None:
                         # Rename tree item
                         treeModel.modifyElement(treeItem, name, newPath)
                     doRefreshView = True
@@ -416,7 +416,7 @@ class GaoLibInfoWidget(QtWidgets.QWidget, InfoWidget):
                             "Impossible to Move folder",
                         )
                         raise
-                    if isFolder:
+                    if isFolder and treeItem is not None:
                         # Modify tree item
                         treeModel.modifyElement(
                             treeItem, name, os.path.join(path, name)
@@ -424,23 +424,15 @@ class GaoLibInfoWidget(QtWidgets.QWidget, InfoWidget):
                     doRefreshView = True
 
                 if doRefreshView:
-                    # Restore expand state and selected item
-                    self.mainWindow.restoreExpandedState(expanded, selectedItemPath)
-
-                    # Select MODIFIED item
-                    currentIndex = None
-                    for item in self.mainWindow.items.keys():
-                        if self.mainWindow.items[item].name == name:
-                            currentIndex = item
-                            break
-
-                    if currentIndex is not None:
-                        index = self.mainWindow.listView.model().index(currentIndex, 0)
-                        self.mainWindow.listView.selectionModel().select(
-                            index, QtCore.QItemSelectionModel.Select
-                        )
-                    else:
-                        self.mainWindow.cleanInfoWidget()
+                    # Apply changes to tree and list views
+                    newParentItem = self.mainWindow.treeModel.getElemWithPath(path)
+                    if (
+                        newParentItem is not None
+                        and newParentItem.path != oldParentPath
+                    ):
+                        self.mainWindow.refreshLibrary(newParentItem.path)
+                    # Select MODIFIED item once listed
+                    self.mainWindow.refreshLibrary(oldParentPath, selectName=name)
             else:
                 QtWidgets.QMessageBox.about(
                     self, "Abort action", "Folder name must not be empty."
@@ -604,9 +596,6 @@ class GaoLibInfoWidget(QtWidgets.QWidget, InfoWidget):
         rsp = dialog.exec_()
         # if user clicks on 'ok'
         if rsp == QtWidgets.QDialog.Accepted:
-            # Remember current tree selection
-            selectedItemPath = self.mainWindow.currentTreeElement.path
-
             # trashPath = os.path.join(self.mainWindow.rootPath, "../trash")
             # if not os.path.exists(trashPath):
             #     os.makedirs(trashPath)
@@ -689,25 +678,11 @@ class GaoLibInfoWidget(QtWidgets.QWidget, InfoWidget):
             # if all files have been deleted, remove the folder as well
             if allDeleted:
                 shutil.rmtree(path)
-
-            # Remember expanded states in tree view
-            expanded = self.mainWindow.getTreeExpandedItems()
-            if self.item.itemType == "FOLDER" or self.mainWindow.itemsInTree:
-                # Delete item from tree model
-                itemPath = self.item.path
-                model = self.mainWindow.treeModel
-                treeItem = model.getElemWithPath(itemPath)
-                if itemPath == selectedItemPath:
-                    selectedItemPath = treeItem.parent.path
-                # Remove item
-                model.removeElement(treeItem)
-                # Update filter
-                self.mainWindow.updateTreeFilter()
-                # Restore expand state and selected item
-                self.mainWindow.restoreExpandedState(expanded, selectedItemPath)
-            if self.item.itemType != "FOLDER":
-                self.mainWindow.items = self.mainWindow.getListItems()
-                self.mainWindow.setListView()
+            elif self.mainWindow.getCatalog(path) is not None:
+                # parent folder mtime did not change, force its rescan to drop the item
+                self.mainWindow.getCatalog(path).invalidate(os.path.dirname(path))
+            # Remove item from tree and list views
+            self.mainWindow.refreshLibrary(os.path.dirname(path))
 
     def updateConstraintPairingList(self):
         """Update pairing list combobox"""
@@ -768,12 +743,16 @@ class GaoLibInfoWidget(QtWidgets.QWidget, InfoWidget):
         return pairingDict
 
     def getItemDict(self):
+        """Return the data of the item json file, parsed at first call"""
+        if self.itemDict is not None:
+            return self.itemDict
         for file in os.listdir(self.item.path):
             if file.endswith(".json"):
                 jsonPath = os.path.join(self.item.path, file)
                 itemdata = {}
                 with open(jsonPath) as file:
                     itemdata = json.load(file)
+                    self.itemDict = itemdata
                     return itemdata
 
     def showInfos(self):
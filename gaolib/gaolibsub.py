@@ -31,16 +31,28 @@ from datetime import datetime
 from PySide6 import QtCore, QtGui, QtWidgets
 from PySide6.QtWidgets import QFileDialog
 
-import gaolib.model.thumbnailcache as thc
 from gaolib.createposewidget import CreatePoseWidget
 from gaolib.gaolibinfowidget import GaoLibInfoWidget
+from gaolib.model.catalogupdatetask import CatalogUpdateSignals, CatalogUpdateTask
 from gaolib.model.gaocustomlistview import GaoCustomListView
-from gaolib.model.gaolibitem import GaoLibItem
-from gaolib.model.gaoliblistmodel import GaoLibListModel
+from gaolib.model.gaolibcatalog import GaoLibCatalog
+from gaolib.model.gaolibitem import SORT_MODES, GaoLibItem, writeItemSummary
+from gaolib.model.gaoliblistmodel import GaoLibListModel, RecordRole
+from gaolib.model.gaolibrefreshengine import GaoLibRefreshEngine
+from gaolib.model.gaolibscanner import DEFAULT_WORKERS
 from gaolib.model.gaolibtreeitem import GaoLibTreeItem
 from gaolib.model.gaolibtreeitemmodel import GaoLibTreeItemModel
+from gaolib.model.gaolibwatcher import GaoLibWatcher
 from gaolib.model.hoverdelegate import HoverDelegate
+from gaolib.model.listitemfilterproxymodel import (
+    SEARCH_DELAY,
+    ListItemFilterProxyModel,
+)
+from gaolib.model.listingtask import ListingSignals, ListingTask
 from gaolib.model.rootitemwidget import RootItemWidget
+from gaolib.model.searchtask import SearchTask
+from gaolib.model.thumbnailcache import DEFAULT_CACHE_MB, ThumbnailCache
+from gaolib.model.thumbnailprefetcher import ThumbnailPrefetcher
 from gaolib.model.treeitemfilterproxymodel import TreeItemFilterProxyModel
 from gaolib.ui.gaolibui import Ui_MainWindow as GaolibMainWindow
 from gaolib.ui.newfolderdialogui import Ui_Dialog as NewFolderDialog
@@ -86,11 +98,45 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
         self.projName = ""
         self.rootPath = None
         self.rootList = []
+        self.catalogs = {}
+        self.refreshEngine = GaoLibRefreshEngine(self)
+        self.watcher = GaoLibWatcher(self, parent=self)
+        # folder content is listed in a worker thread, a new listing cancels the previous
+        self.listingPool = QtCore.QThreadPool(self)
+        self.listingPool.setMaxThreadCount(2)
+        # libraries are scanned in their own pool, listings never wait for them
+        self.scanPool = QtCore.QThreadPool(self)
+        self.scanPool.setMaxThreadCount(1)
+        self.listingSignals = ListingSignals(self)
+        self.listingSignals.chunkReady.connect(self.onListingChunk)
+        self.listingSignals.finished.connect(self.onListingFinished)
+        self.listingGeneration = 0
+        self.listingStream = False
+        self.listingSelectName = None
+        self.listingRecords = []
+        # libraries are scanned in a worker before the first tree search
+        self.treeSearchSignals = CatalogUpdateSignals(self)
+        self.treeSearchSignals.finished.connect(self.onTreeSearchScanned)
+        self.treeSearchScanning = False
+        # disk changes of a refresh are applied to the tree when scanned
+        self.refreshSignals = CatalogUpdateSignals(self)
+        self.refreshSignals.finished.connect(self.refreshEngine.syncChangedPaths)
+        # list is filtered when the user stops typing
+        self.searchTimer = QtCore.QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(SEARCH_DELAY)
+        self.searchTimer.timeout.connect(self.filterList)
+        # query of the search in all libraries, None when listing current folder
+        self.searchQuery = None
+        # order of the list view, one of SORT_MODES
+        self.sortMode = "name"
         self.recursiveDisplayMode = False
         self.itemsInTree = False
         self.useDoubleClickToApplyPose = False
         self.useWheelToBlendPose = False
         self.ffmpegPath = None
+        self.scanWorkers = DEFAULT_WORKERS
+        self.thumbnailCacheMb = DEFAULT_CACHE_MB
         self.listView = GaoCustomListView(parent=self)
         self.listView.setSpacing(10)
         self.listView.setMinimumSize(QtCore.QSize(50, 50))
@@ -102,22 +148,35 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
         self.listView.setResizeMode(QtWidgets.QListView.Fixed)
         self.listView.setViewMode(QtWidgets.QListView.IconMode)
         self.verticalLayout_2.addWidget(self.listView)
+        self.createListModel()
+        # used when the first folder is selected by initUi
+        self.createSearchAllAction()
         self.initUi()
         self.settingsPushButton.setStyleSheet(
             "QPushButton::menu-indicator { width:0px; }"
         )
         self.newPushButton.setStyleSheet("QPushButton::menu-indicator { width:0px; }")
         self._connectUi()
-        #
-        cache = thc.ThumbnailCache.instance()
-        cache.thumbnailLoaded.connect(self.onThumbLoaded)
         # If temp folder is not empty, clean items
         self.cleanTempFolder()
 
+    def createSearchAllAction(self):
+        """Add the button switching the list search to all libraries"""
+        iconFolder = os.path.join(os.path.dirname(os.path.realpath(__file__)), "icons")
+        self.searchAllAction = self.searchEdit.addAction(
+            QtGui.QIcon(QtGui.QPixmap(os.path.join(iconFolder, "gaolib.png"))),
+            QtWidgets.QLineEdit.TrailingPosition,
+        )
+        self.searchAllAction.setCheckable(True)
+        self.searchAllAction.setToolTip(
+            "Search all libraries (name, user:, date:, bone:, object:, type:)"
+        )
+
     def _connectUi(self):
         # Connect Actions
         self.searchHierarchyEdit.textChanged.connect(self.filterTree)
-        self.searchEdit.textChanged.connect(self.filterList)
+        self.searchEdit.textChanged.connect(lambda text: self.searchTimer.start())
+        self.searchAllAction.triggered.connect(self.filterList)
         # Set menus for buttons in the main window
         self.createMenuNew()
         self.createMenuSettings()
@@ -163,10 +222,25 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
         # Settings functionnalities
         createMenu = QtWidgets.QMenu(self.settingsPushButton)
         createMenu.addAction("Settings", self.settings)
+        sortMenu = createMenu.addMenu("Sort by")
+        sortGroup = QtGui.QActionGroup(sortMenu)
+        for sortMode in SORT_MODES:
+            sortAction = sortMenu.addAction(
+                sortMode.capitalize(),
+                lambda sortMode=sortMode: self.setSortMode(sortMode),
+            )
+            sortAction.setCheckable(True)
+            sortAction.setChecked(sortMode == self.sortMode)
+            sortGroup.addAction(sortAction)
         # refreshAction = createMenu.addAction("Refresh central view", self.setListView)
         # refreshAction.setShortcut(QtGui.QKeySequence("Ctrl+R"))
         self.settingsPushButton.setMenu(createMenu)
 
+    def setSortMode(self, sortMode):
+        """Sort list view in given mode (one of SORT_MODES)"""
+        self.sortMode = sortMode
+        self.proxyModel.sourceModel().setSortMode(sortMode)
+
     def readConfig(self, allowMessage=True):
         """Read Json config"""
         self.rootList = []
@@ -196,6 +270,18 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
                     self.useDoubleClickToApplyPose = False
                 if "ffmpegPath" in itemdata.keys():
                     self.ffmpegPath = itemdata["ffmpegPath"]
+                # number of threads listing the library folders
+                if "scanWorkers" in itemdata.keys():
+                    self.scanWorkers = itemdata["scanWorkers"]
+                else:
+                    self.scanWorkers = DEFAULT_WORKERS
+                # memory used by the thumbnails of the list view
+                if "thumbnailCacheMb" in itemdata.keys():
+                    self.thumbnailCacheMb = itemdata["thumbnailCacheMb"]
+                else:
+                    self.thumbnailCacheMb = DEFAULT_CACHE_MB
+        ThumbnailCache.instance().setMaxBytes(self.thumbnailCacheMb * 1024 * 1024)
+        ThumbnailCache.instance().setCatalogFinder(self.getCatalog)
         # FFMPEG_PATH can be set as environment variable, if so, this value prevales on the settings
         if "FFMPEG_PATH" not in os.environ.keys() or not os.path.isfile(
             os.environ["FFMPEG_PATH"]
@@ -263,6 +349,9 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
             dialog.ui.doubleClickPoseShortcutCheckBox.isChecked()
         )
         ffmpegPath = dialog.ui.ffmpegPathLlineEdit.text()
+        # Remember hierarchy settings to know if tree must be rebuilt
+        oldRootList = list(self.rootList)
+        oldItemsInTree = self.itemsInTree
         # The user clicks OK
         if rsp == QtWidgets.QDialog.Accepted:
             self.readConfig(allowMessage=False)
@@ -285,6 +374,8 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
                                 "useWheelToBlendPose": useWheelToBlendPose,
                                 "useDoubleClickToApplyPose": useDoubleClickToApplyPose,
                                 "ffmpegPath": ffmpegPath,
+                                "scanWorkers": self.scanWorkers,
+                                "thumbnailCacheMb": self.thumbnailCacheMb,
                             },
                             file,
                             indent=4,
@@ -319,6 +410,8 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
                                     "useWheelToBlendPose": useWheelToBlendPose,
                                     "useDoubleClickToApplyPose": useDoubleClickToApplyPose,
                                     "ffmpegPath": ffmpegPath,
+                                    "scanWorkers": self.scanWorkers,
+                                    "thumbnailCacheMb": self.thumbnailCacheMb,
                                 },
                                 file,
                                 indent=4,
@@ -345,14 +438,49 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
                                 "useWheelToBlendPose": self.useWheelToBlendPose,
                                 "useDoubleClickToApplyPose": self.useDoubleClickToApplyPose,
                                 "ffmpegPath": self.ffmpegPath,
+                                "scanWorkers": self.scanWorkers,
+                                "thumbnailCacheMb": self.thumbnailCacheMb,
                             },
                             file,
                             indent=4,
                             sort_keys=True,
                         )
 
-        self.currentTreeElement = None
-        self.setTreeView()
+        self.readConfig(allowMessage=False)
+        if self.rootList == oldRootList and self.itemsInTree == oldItemsInTree:
+            # Same hierarchy, only apply changes found on disk
+            self.refreshLibrary()
+        else:
+            self.currentTreeElement = None
+            self.setTreeView()
+
+    def refreshLibrary(self, path=None, selectName=None):
+        """Apply changes found on disk under path (all ROOTs if None) to the views"""
+        # disk is read in a worker, the list view is listed again meanwhile
+        listed = (
+            path is not None
+            and self.currentTreeElement is not None
+            and self.searchQuery is None
+            and self.watcher.affectsListView(path)
+        )
+        # the listing scans its folder itself, it is not scanned twice at once
+        if not listed:
+            self.scanPool.start(
+                CatalogUpdateTask(
+                    list(self.catalogs.values()),
+                    self.refreshSignals,
+                    paths=[path] if path else None,
+                    recursive=path is None,
+                    checkItems=True,
+                )
+            )
+        if self.currentTreeElement is not None:
+            # items rewritten in place by other tools are found by a refresh
+            self.refreshListView(selectName=selectName, checkItems=True)
+
+    def refreshListView(self, selectName=None, checkItems=False):
+        """Apply changes of the current folder content to the list model, row by row"""
+        self.startListing(selectName=selectName, checkItems=checkItems)
 
     def openFileNameDialog(self, dialog, openDirectory=None):
         """File browser to change the ROOT location"""
@@ -446,74 +574,22 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
                         self, "Abort action", "Folder already exists : " + folderPath
                     )
                 else:
-                    # Remember expanded states in tree view
-                    expanded = self.getTreeExpandedItems()
-                    # Creates new folder and add it to the hierachy
+                    # Creates new folder
                     os.mkdir(folderPath)
-                    parentItem = self.currentTreeElement
-                    selectedItemPath = parentItem.path
-                    ancestors = parentItem.ancestors + [parentItem]
-                    ancestorNames = []
-                    for ances in ancestors:
-                        ancestorNames.append(ances.name)
-
-                    path = os.path.join(parentItem.path, name)
                     # Copy thumbnail
                     folderIconPath = os.path.join(
                         folderIcons, dialog.ui.iconComboBox.currentText()
                     )
                     if os.path.isfile(folderIconPath):
-                        thumbnailPath = os.path.join(path, "thumbnail.png")
+                        thumbnailPath = os.path.join(folderPath, "thumbnail.png")
                         shutil.copyfile(folderIconPath, thumbnailPath)
-                    newItem = GaoLibTreeItem(name, ancestors=ancestors, path=path)
-
-                    # refresh TreeView
-                    self.treeModel.addElement(newItem, parentItem)
-
-                    # Update filter
-                    self.updateTreeFilter()
-                    # Restore expand state and selected item
-                    self.restoreExpandedState(expanded, selectedItemPath)
+                    # Add it to the hierarchy and the list view
+                    self.refreshLibrary(self.currentTreeElement.path)
             else:
                 QtWidgets.QMessageBox.about(
                     self, "Abort action", "Folder name must not be empty."
                 )
 
-    def restoreExpandedState(self, expanded, selectedItemPath):
-        """Expand items corresponding to given list of treeModel item indexes"""
-        for idx in expanded:
-            mappedIdx = self.treeItemProxyModel.mapFromSource(idx)
-            self.hierarchyTreeView.expand(mappedIdx)
-            # Restore current selection
-            elem = self.treeModel.getElement(idx)
-            if elem.path == selectedItemPath:
-                self.treeSelectionModel.clear()
-                self.treeSelectionModel.select(
-                    mappedIdx, QtCore.QItemSelectionModel.Select
-                )
-
-    def getTreeExpandedItems(self):
-        """Get list of index of expanded items in TreeView"""
-        # Get all proxy filter indexes
-        proxyIndexes = []
-        allIndexes = self.treeModel.getAllIndexes(
-            currentElem=None, currentIdx=QtCore.QModelIndex(), indexes=[]
-        )
-        for idx in allIndexes:
-            mapped = self.treeItemProxyModel.mapFromSource(idx)
-            proxyIndexes.append(mapped)
-
-        # Check expand state in treeview for each proxy filter index
-        expandedIndexes = []
-        for idx in proxyIndexes:
-            if self.hierarchyTreeView.isExpanded(idx):
-                mappedIdx = idx.model().mapToSource(idx)
-                expandedIndexes.append(mappedIdx)
-            elif idx == self.hierarchyTreeView.selectionModel().currentIndex():
-                mappedIdx = idx.model().mapToSource(idx)
-                expandedIndexes.append(mappedIdx)
-        return expandedIndexes
-
     def cleanTempFolder(self):
         tempPath = os.path.join(
             bpy.context.preferences.filepaths.temporary_directory, "gaolib_temp"
@@ -654,7 +730,6 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
 
     def savePose(self, itemType="POSE"):
         """Save a new item in the library"""
-        updateTreeView = self.itemsInTree # when list changes only need to refresh tree view at item creation if itemsInTree option is true
         # check context and selection
         isValid = self.contextCheck(itemType)
         if not isValid:
@@ -737,7 +812,6 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
                 rsp = dialog.exec_()
                 # if user clicks on 'ok'
                 if rsp == QtWidgets.QDialog.Accepted:
-                    updateTreeView = False
                     if itemType in ["ANIMATION", "MULTI ANIMATION"]:
                         try:
                             os.remove(os.path.join(poseDir, "thumbnail.gif"))
@@ -829,38 +903,12 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
         # Create json in pose directory
         self.writejson(name, poseDir, itemType=itemType)
 
-        # update tree view
-        if updateTreeView:
-            # Remember expanded states in tree view
-            expanded = self.getTreeExpandedItems()
-            parentItem = self.currentTreeElement
-            selectedItemPath = parentItem.path
-            ancestors = parentItem.ancestors + [parentItem]
-            newItem = GaoLibTreeItem(name, ancestors=ancestors, path=poseDir)
-            # refresh TreeView
-            self.treeModel.addElement(newItem, parentItem)
-            # Update filter
-            self.updateTreeFilter()
-            # Restore expand state and selected item
-            self.restoreExpandedState(expanded, selectedItemPath)
-        # Refresh list view
-        oldItems = self.items
-        self.items = self.getListItems()
-        self.setListView()
+        # Refresh tree view and list view with the new item, then select it
+        self.refreshLibrary(parentDir, selectName=name)
 
-        # Find new item
-        newIndex = None
-        for item in self.items.keys():
-            if self.items[item].name == name:
-                newIndex = item
-                break
         # disconnect pushbutton
         if self.createPosewidget.movie is not None:
             self.createPosewidget.movie.setFileName("")
-        # Select newItem
-        index = self.listView.model().index(newIndex, 0)
-        self.listView.selectionModel().clear()
-        self.listView.selectionModel().select(index, QtCore.QItemSelectionModel.Select)
         bpy.context.scene.frame_current = currentFrame
 
     def applyPose(self, itemType="POSE", flipped=False, blendPose=1, currentPose=None):
@@ -1007,6 +1055,8 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
                 data[key] = itemdata[key]
             elif key not in data["metadata"].keys():
                 data["metadata"][key] = itemdata[key]
+        # write summary read by the list view, before the json which ends the save
+        writeItemSummary(directory, data["metadata"])
         # write json
         with open(jsonFile, "w") as file:
             json.dump(data, file, indent=4, sort_keys=True)
@@ -1750,148 +1800,141 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
     def treeElementSelected(self, selectedItem, selectListItem=None):
         """Manage selection in tree view"""
         self.currentTreeElement = selectedItem
-        self.items = self.getListItems()
+        # back to folder content
+        self.searchQuery = None
+        self.searchAllAction.setChecked(False)
+        # rows are added while the folder is listed
+        self.items = {}
         self.setListView()
+        self.startListing(stream=True, selectName=selectListItem)
+        self.watcher.updateWatchedPaths()
         if len(selectedItem.ancestors) > 1:
             self.rootPath = selectedItem.ancestors[1].path
         else:
             self.rootPath = selectedItem.path
-        if selectListItem:
-            model = self.listView.model()
-            for row in range(model.rowCount()):
-                idx = model.index(row, 0)
-                item = idx.data(QtCore.Qt.UserRole)
-                if item.name == selectListItem:
-                    # self.listView.selectionModel().clear()
-                    self.listView.selectionModel().select(
-                        idx, QtCore.QItemSelectionModel.Select
-                    )
 
-    def recursivelyPopulateTreeView(self, parentItem, itemPath, newName=None, step=0):
-        """Recursively populate treeView by parsing directories from the ROOT directory"""
-        ancestors = parentItem.ancestors + [parentItem]
-        itemSuffixes = [
-            "anim",
-            "selection",
-            "pose",
-            "constraint",
-            "multi_pose",
-            "multi_anim",
-        ]
-        for directory in os.listdir(itemPath):
-            if step == 0 and directory != "ROOT":
-                continue
-            directoryPath = os.path.join(itemPath, directory)
-
-            if "." in directory and directory.split(".")[-1] in itemSuffixes :
-                if self.itemsInTree:
-                    # Create Item
-                    item = GaoLibTreeItem(
-                        directory, ancestors=ancestors, path=directoryPath, newName=newName
-                    )
-                    parentItem.addChild(item)
-            elif (
-                os.path.isdir(directoryPath)
-                and directory != "trash"
-                and not directory.startswith(".")
-            ):
-                # Create Item
-                item = GaoLibTreeItem(
-                    directory, ancestors=ancestors, path=directoryPath, newName=newName
-                )
-                parentItem.addChild(item)
-
-                self.recursivelyPopulateTreeView(item, directoryPath, step=step + 1)
-
-    def onThumbLoaded(self, key):
-        # refresh the view when thumbnail is loaded from cache
+    def selectListItem(self, itemName):
+        """Select list view item with given name, return False if not found"""
         model = self.listView.model()
         for row in range(model.rowCount()):
             idx = model.index(row, 0)
-            item = idx.data(QtCore.Qt.UserRole)
-            if item.thumbpath == key:
-                self.listView.viewport().update(self.listView.visualRect(idx))
+            item = idx.data(RecordRole)
+            if item.name == itemName:
+                # self.listView.selectionModel().clear()
+                self.listView.selectionModel().select(
+                    idx, QtCore.QItemSelectionModel.Select
+                )
+                return True
+        return False
 
-    def getListItems(self):
-        """Display current selected folder content in listView"""
-        recursiveSearch = self.recursiveDisplayMode
-        folderPath = self.currentTreeElement.path
-        items = {}
+    def populateTreeFromCatalog(self, parentItem, catalog, newName=None):
+        """Add the ROOT item of one catalog to treeView, its children are loaded on expand"""
+        ancestors = parentItem.ancestors + [parentItem]
+        rootItem = GaoLibTreeItem(
+            "ROOT", ancestors=ancestors, path=catalog.rootPath, newName=newName
+        )
+        parentItem.addChild(rootItem)
+
+    def getCatalog(self, path):
+        """Return the catalog of the ROOT containing given path"""
+        for catalog in self.catalogs.values():
+            if catalog.contains(path):
+                return catalog
+        return None
+
+    def startListing(self, stream=False, selectName=None, checkItems=False):
+        """List current folder content in a worker thread, rows come back by chunks"""
+        self.cancelListing()
+        # stream : chunks are added to the (empty) list model as they come,
+        # else differences with the list model are applied at the end
+        self.listingStream = stream
+        self.listingSelectName = selectName
+        self.listingRecords = []
         QtGui.QPixmapCache.setCacheLimit(102400)
-        # Parse folder
-        if recursiveSearch:
-            i = 0
-            for root, dirs, files in os.walk(folderPath):
-                for it in dirs:
-                    itPath = os.path.join(root, it)
-                    if (
-                        it.endswith(".anim")
-                        or it.endswith(".pose")
-                        or it.endswith(".selection")
-                        or it.endswith(".constraint")
-                        or it.endswith(".multi_pose")
-                        or it.endswith(".multi_anim")
-                    ):
-                        if os.path.isfile(itPath + "/todelete"):
-                            try:
-                                shutil.rmtree(itPath)
-                            except:
-                                pass
-                            continue
-                        stamped = os.path.join(itPath, "thumbnail_stamped.png")
-                        stamped = stamped.replace("\\", "/")
-                        if not os.path.isfile(stamped):
-                            stamped = os.path.join(itPath, "thumbnail.png")
-                            if not os.path.isfile(stamped):
-                                stamped = "icons/nopreview2.png"
-                        # Create Item
-                        gaoLibItem = GaoLibItem(name=it, thumbpath=stamped, path=itPath)
-                        items[i] = gaoLibItem
-                        i += 1
-        else:
-            i = 0
-            for it in os.listdir(folderPath):
-                itPath = os.path.join(folderPath, it)
-                if os.path.isdir(itPath):
-                    if os.path.isfile(itPath + "/todelete"):
-                        try:
-                            shutil.rmtree(itPath)
-                        except:
-                            pass
-                        continue
-                    thumbnailPath = os.path.join(itPath, "thumbnail_stamped.png")
-                    if os.path.isfile(thumbnailPath):
-                        thumbpath = thumbnailPath.replace("\\", "/")
-                    elif os.path.isfile(thumbnailPath.replace("_stamped", "")):
-                        thumbpath = thumbnailPath.replace("_stamped", "").replace(
-                            "\\", "/"
-                        )
-                    elif (
-                        os.path.isdir(itPath)
-                        and not it.endswith(".anim")
-                        and not it.endswith(".pose")
-                        and not it.endswith(".selection")
-                        and not it.endswith(".constraint")
-                        and not it.endswith(".multi_pose")
-                        and not it.endswith(".multi_anim")
-                    ):
-                        thumbpath = os.path.join(
-                            os.path.dirname(os.path.realpath(__file__)),
-                            "icons/folder2.png",
-                        )
-                    else:
-                        thumbpath = "icons/nopreview2.png"
+        generation = self.listingGeneration
+        if self.searchQuery is not None:
+            task = SearchTask(
+                generation,
+                list(self.catalogs.values()),
+                self.searchQuery,
+                self.listingSignals,
+                lambda: generation == self.listingGeneration,
+                sortMode=self.sortMode,
+            )
+            self.listingPool.start(task)
+            return
+        folderPath = self.currentTreeElement.path
+        catalog = self.getCatalog(folderPath)
+        if catalog is None:
+            self.onListingFinished(self.listingGeneration, [])
+            return
+        task = ListingTask(
+            generation,
+            catalog,
+            folderPath,
+            self.recursiveDisplayMode,
+            self.listingSignals,
+            lambda: generation == self.listingGeneration,
+            sortMode=self.sortMode,
+            checkItems=checkItems,
+        )
+        self.listingPool.start(task)
+
+    def cancelListing(self):
+        """Ignore results of the running listing"""
+        self.listingGeneration += 1
 
-                    # Create Item
-                    gaoLibItem = GaoLibItem(name=it, thumbpath=thumbpath, path=itPath)
-                    items[i] = gaoLibItem
-                    i += 1
+    def onListingChunk(self, generation, records):
+        """Receive a chunk of the current folder content"""
+        if generation != self.listingGeneration:
+            return
+        self.listingRecords += records
+        if self.listingStream:
+            self.proxyModel.sourceModel().appendItems(records)
+
+    def onListingFinished(self, generation, changedPaths):
+        """Apply the end of a listing to the views"""
+        # disk changes found by cancelled listings are applied to the tree too
+        self.refreshEngine.syncChangedPaths(changedPaths)
+        if generation != self.listingGeneration:
+            return
+        self.items = dict(enumerate(self.listingRecords))
+        self.listingRecords = []
+        if not self.listingStream:
+            self.proxyModel.sourceModel().updateItems(self.items)
+        if self.listingSelectName:
+            self.listView.selectionModel().clear()
+            if not self.selectListItem(self.listingSelectName):
+                self.cleanInfoWidget()
+            self.listingSelectName = None
+
+    def loadListItems(self, records):
+        """Return GaoLibItems of given list records, infos are read from the catalogs"""
+        entries = {}
+        for catalog in self.catalogs.values():
+            paths = [record.path for record in records if catalog.contains(record.path)]
+            if paths:
+                entries.update(catalog.getEntries(paths))
+        items = []
+        for record in records:
+            infos = None
+            if record.path in entries.keys():
+                infos = entries[record.path]._asdict()
+            items.append(
+                GaoLibItem(
+                    name=record.name,
+                    thumbpath=record.thumbpath,
+                    path=record.path,
+                    infos=infos,
+                )
+            )
         return items
 
     def selectChildItemInTree(self, itemName):
         """Select one item in treeView knowing its parent(the current selection) and its name"""
 
         parent = self.currentTreeElement
+        self.treeModel.fetchElement(parent)
         # Get all parent children names
         childrenNames = []
         for child in parent.children:
@@ -1944,60 +1987,66 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
         if itemType == "FOLDER":
             self.selectChildItemInTree(itemName)
 
-    def setListView(self):
-        """Set list model and connect it to UI"""
-        if self.listView.isSignalConnected(
-            QtCore.QMetaMethod.fromSignal(self.listView.doubleClicked)
-        ):
-            self.listView.doubleClicked.disconnect()
-
+    def createListModel(self):
+        """Create list model, filter and delegate, kept for the whole session"""
         # Manage ListView (central widget)
         # Create Qt Model
-        model = GaoLibListModel(self.items)
-        self.proxyModel = QtCore.QSortFilterProxyModel()
+        model = GaoLibListModel(
+            self.items, loadCallback=self.loadListItems, sortMode=self.sortMode
+        )
+        self.proxyModel = ListItemFilterProxyModel()
         self.proxyModel.setSourceModel(model)
         self.listView.setModel(self.proxyModel)
         # use a delegate to play the gif when hovering on item
-        delegate = HoverDelegate(self.listView)
-        self.listView.setItemDelegate(delegate)
+        self.listDelegate = HoverDelegate(self.listView)
+        self.listView.setItemDelegate(self.listDelegate)
         # display optimization
         self.listView.setViewMode(QtWidgets.QListView.IconMode)
         self.listView.setResizeMode(QtWidgets.QListView.Adjust)
         # necessary to detect hover
         self.listView.setMouseTracking(True)
-
-        # call to gif player when hovering
-        def on_hover_changed(index):
-            if index:
-                delegate.set_hover_index(index)
-            else:
-                delegate.clear_hover_index()
-
-        self.listView.hoverChanged.connect(on_hover_changed)
+        self.listView.hoverChanged.connect(self.listHoverChanged)
+        # thumbnails of visible rows are loaded first
+        self.thumbnailPrefetcher = ThumbnailPrefetcher(self.listView, parent=self)
         #
         self.listView.selectionModel().selectionChanged.connect(self.listItemSelected)
-        self.proxyModel.sort(0, QtCore.Qt.AscendingOrder)
-        self.proxyModel.setSortCaseSensitivity(QtCore.Qt.CaseInsensitive)
         self.listView.doubleClicked.connect(self.itemDoubleClick)
 
+    def listHoverChanged(self, index):
+        """Call to gif player when hovering"""
+        if index:
+            self.listDelegate.set_hover_index(index)
+        else:
+            self.listDelegate.clear_hover_index()
+
+    def setListView(self):
+        """Display self.items in the list view, the list model is reset with them"""
+        self.listDelegate.clear_hover_index()
+        self.proxyModel.sourceModel().setItems(self.items)
+        # search results are not filtered by name
+        if self.searchQuery is None:
+            self.proxyModel.setFilterText(self.searchEdit.text())
+        else:
+            self.proxyModel.setFilterText("")
+
     def updateTreeFilter(self):
         """Update QSortFilterProxyModel for tree View"""
         self.treeItemProxyModel = TreeItemFilterProxyModel()
+        # tree model children are already sorted by name
         self.treeItemProxyModel.setSourceModel(self.treeModel)
-        self.treeItemProxyModel.setSortRole(QtCore.Qt.DisplayRole)
 
         self.hierarchyTreeView.setModel(self.treeItemProxyModel)
         self.treeSelectionModel = self.hierarchyTreeView.selectionModel()
         self.treeSelectionModel.selectionChanged.connect(self.folderSelected)
-        self.treeItemProxyModel.sort(0, QtCore.Qt.AscendingOrder)
-        self.treeItemProxyModel.setSortCaseSensitivity(QtCore.Qt.CaseInsensitive)
 
     def setTreeView(self):
         """Set Tree model and connect it to UI"""
         self.readConfig()
+        self.cancelListing()
 
         self.treeroot = GaoLibTreeItem("root")
         rootName = None
+        catalogs = {}
         for rootItem in self.rootList:
             # self.treeroot = GaoLibTreeItem("Root", path=self.rootPath)
             rootPath = rootItem["path"]
@@ -2006,9 +2055,22 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
             if not self.currentTreeElement:
                 self.currentTreeElement = self.treeroot
             if os.path.isdir(rootPath):
-                self.recursivelyPopulateTreeView(
-                    self.treeroot, rootPath, newName=rootName
-                )
+                libraryPath = os.path.join(rootPath, "ROOT")
+                if os.path.isdir(libraryPath):
+                    # Reuse catalog of already known ROOT
+                    if libraryPath in self.catalogs.keys():
+                        catalog = self.catalogs[libraryPath]
+                        catalog.maxWorkers = self.scanWorkers
+                    else:
+                        catalog = GaoLibCatalog(
+                            libraryPath, maxWorkers=self.scanWorkers
+                        )
+                    catalogs[libraryPath] = catalog
+                    # deeper folders are listed when expanded
+                    catalog.update(recursive=False)
+                    self.populateTreeFromCatalog(
+                        self.treeroot, catalog, newName=rootName
+                    )
                 self.rootPath = rootPath
             else:
                 QtWidgets.QMessageBox.about(
@@ -2017,7 +2079,16 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
                     "Root folder does not exist :\n" + str(rootPath),
                 )
 
-        self.treeModel = GaoLibTreeItemModel(self.treeroot, projName=self.projName)
+        self.catalogs = catalogs
+        self.treeroot.fetched = True
+        self.treeModel = GaoLibTreeItemModel(
+            self.treeroot,
+            projName=self.projName,
+            fetchCallback=self.refreshEngine.getTreeChildren,
+        )
+        # top level folders are displayed at start
+        for rootTreeItem in self.treeroot.children:
+            self.treeModel.fetchElement(rootTreeItem)
         self.updateTreeFilter()
 
         if rootName:
@@ -2026,6 +2097,7 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
             self.items = {}
 
         self.setListView()
+        self.watcher.updateWatchedPaths()
 
     def initUi(self):
         """INIT"""
@@ -2054,23 +2126,56 @@ class GaoLib(QtWidgets.QMainWindow, GaolibMainWindow):
         # else:
         #     self.hierarchyTreeView.collapseAll()
 
-        regExp = QtCore.QRegularExpression(
-            str(filterText), QtCore.QRegularExpression.CaseInsensitiveOption
-        )
-        self.treeItemProxyModel.text = filterText
-        self.treeItemProxyModel.setFilterRegularExpression(regExp)
-        self.hierarchyTreeView.expandAll()
-        if not len(filterText):
+        if len(filterText):
+            # search needs the whole tree, libraries are scanned once in a worker
+            if all([catalog.fullyScanned for catalog in self.catalogs.values()]):
+                self.refreshEngine.updateOnFetch = False
+                try:
+                    self.treeModel.fetchAll()
+                finally:
+                    self.refreshEngine.updateOnFetch = True
+            elif not self.treeSearchScanning:
+                self.treeSearchScanning = True
+                catalogs = [
+                    catalog
+                    for catalog in self.catalogs.values()
+                    if not catalog.fullyScanned
+                ]
+                self.scanPool.start(CatalogUpdateTask(catalogs, self.treeSearchSignals))
+        self.treeItemProxyModel.setFilterText(filterText)
+        if len(filterText):
+            # expanding would list folders on the GUI thread, done once scanned
+            if not self.treeSearchScanning:
+                self.hierarchyTreeView.expandAll()
+        else:
             self.hierarchyTreeView.expandToDepth(0)
 
+    def onTreeSearchScanned(self, changedPaths):
+        """Fill the tree from the scanned libraries, then filter it again"""
+        self.treeSearchScanning = False
+        self.refreshEngine.syncChangedPaths(changedPaths)
+        if self.searchHierarchyEdit.text() and all(
+            [catalog.fullyScanned for catalog in self.catalogs.values()]
+        ):
+            self.filterTree()
+
     @QtCore.Slot()
     def filterList(self):
         """Manage text filter research for ListView"""
-        filterText = self.searchEdit.text()
-        regExp = QtCore.QRegularExpression(
-            str(filterText), QtCore.QRegularExpression.CaseInsensitiveOption
-        )
-        self.proxyModel.setFilterRegularExpression(regExp)
+        self.searchTimer.stop()
+        text = self.searchEdit.text()
+        query = None
+        if self.searchAllAction.isChecked() and text.strip():
+            query = text
+        if query != self.searchQuery:
+            # list view switches between search results and folder content
+            self.searchQuery = query
+            self.items = {}
+            self.setListView()
+            if query is not None or self.currentTreeElement is not None:
+                self.startListing(stream=True)
+        elif query is None:
+            self.proxyModel.setFilterText(text)
 
 
 if __name__ == "__main__":
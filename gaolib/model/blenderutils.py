@@ -32,6 +32,8 @@ except:
 
 from PySide6 import QtCore, QtWidgets
 
+from gaolib.model.gaolibitem import writeItemSummary
+
 
 def context_set(c, m=False):
     """Set current Context"""
@@ -534,6 +536,11 @@ def updateSelectionSet(infoWidget, add=True):
     # write json
     with open(jsonPath, "w") as file:
         json.dump(itemdata, file, indent=4, sort_keys=True)
+    writeItemSummary(itemPath, itemdata["metadata"])
+    # Files were modified in place, the item folder has to be read again
+    catalog = infoWidget.mainWindow.getCatalog(itemPath)
+    if catalog is not None:
+        catalog.invalidate(os.path.dirname(itemPath))
     # Update displayed informations
     infoWidget.contentLabel.setText(itemdata["metadata"]["content"])
     selectBones(jsonPath)
@@ -0,0 +1,60 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+from PySide6 import QtCore
+
+
+class CatalogUpdateSignals(QtCore.QObject):
+    """Signals of the catalog update tasks, received in the GUI thread (queued)"""
+
+    # list of directories modified on disk
+    finished = QtCore.Signal(object)
+
+
+class CatalogUpdateTask(QtCore.QRunnable):
+    """Rescan libraries directories modified on disk, out of the GUI thread"""
+
+    def __init__(self, catalogs, signals, paths=None, recursive=True, checkItems=False):
+        super(CatalogUpdateTask, self).__init__()
+        self.catalogs = catalogs
+        self.signals = signals
+        # directories to scan, whole libraries if None
+        self.paths = paths
+        self.recursive = recursive
+        # items changed in place are looked for too, for explicit refreshes
+        self.checkItems = checkItems
+
+    def run(self):
+        """Update catalogs from disk, send the modified directories"""
+        changed = []
+        try:
+            for catalog in self.catalogs:
+                # sub folders are listed in parallel by the scanner
+                if self.paths is None:
+                    changed += catalog.update(checkItems=self.checkItems)
+                    continue
+                paths = [path for path in self.paths if catalog.contains(path)]
+                if paths:
+                    changed += catalog.updateDirectories(
+                        paths, recursive=self.recursive, checkItems=self.checkItems
+                    )
+        except Exception as e:
+            print("Info : Could not update catalogs : " + str(e))
+        finally:
+            self.signals.finished.emit(changed)
@@ -0,0 +1,504 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import namedtuple
+
+from gaolib.model.gaolibscanner import DEFAULT_WORKERS, GaoLibScanner
+
+# Increase when the tables change, the catalog is then rebuilt from disk
+SCHEMA_VERSION = 3
+# Fields of the search index, a query word can be restricted to one with "field:word"
+SEARCH_FIELDS = ["name", "user", "date", "bone", "object", "type"]
+SEARCH_ALIASES = {"owner": "user", "bones": "bone", "objects": "object"}
+# Greater than any character, upper bound of the terms starting with a word
+LAST_CHARACTER = chr(0x10FFFF)
+
+CatalogEntry = namedtuple(
+    "CatalogEntry",
+    [
+        "path",
+        "name",
+        "itemType",
+        "thumbnail",
+        "owner",
+        "date",
+        "content",
+        "frameRange",
+        "objects",
+        "boneNames",
+        "bonesSelection",
+        "mtime",
+    ],
+)
+# Columns needed to list entries, without the decoding of their infos
+CatalogRecord = namedtuple(
+    "CatalogRecord",
+    ["path", "name", "itemType", "thumbnail", "mtime", "owner", "date"],
+)
+
+
+def getSearchTerms(value):
+    """Return lowercase search terms of given value : the whole value and its words"""
+    value = str(value)
+    # camelCase words are split too
+    words = re.split(r"[\W_]+", re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", value).lower())
+    terms = set([word for word in words if len(word) > 1])
+    if value:
+        terms.add(value.lower())
+    return terms
+
+
+def parseSearchQuery(text):
+    """Return list of (field, word) of a search query, field is None for any field"""
+    query = []
+    for word in text.lower().split():
+        field = None
+        if ":" in word:
+            prefix, value = word.split(":", 1)
+            prefix = SEARCH_ALIASES.get(prefix, prefix)
+            if prefix in SEARCH_FIELDS:
+                if not value:
+                    continue
+                field, word = prefix, value
+        query.append((field, word))
+    return query
+
+
+class GaoLibCatalog(object):
+    """Persistent index of the folders and items of one library ROOT"""
+
+    def __init__(self, rootPath, maxWorkers=DEFAULT_WORKERS):
+        self.rootPath = rootPath
+        self.maxWorkers = maxWorkers
+        # True once the whole ROOT was scanned, search results are then complete
+        self.fullyScanned = False
+        self._lock = threading.RLock()
+        self._connection = self.connect()
+
+    def getDatabasePaths(self):
+        """Return candidate database paths, shared one first then local one"""
+        sharedPath = os.path.join(self.rootPath, ".gaolib", "index.sqlite")
+        rootHash = hashlib.md5(
+            os.path.normcase(os.path.realpath(self.rootPath)).encode("utf-8")
+        ).hexdigest()
+        localPath = os.path.join(
+            os.path.expanduser("~"),
+            "blenderTemp",
+            "gaolib_config",
+            "catalogs",
+            rootHash + ".sqlite",
+        )
+        return [sharedPath, localPath]
+
+    def connect(self):
+        """Open the catalog database, fall back to a local or in memory one"""
+        for dbPath in self.getDatabasePaths():
+            try:
+                if not os.path.isdir(os.path.dirname(dbPath)):
+                    os.makedirs(os.path.dirname(dbPath))
+                connection = sqlite3.connect(
+                    dbPath, timeout=10, check_same_thread=False
+                )
+                self.initTables(connection)
+                self.dbPath = dbPath
+                return connection
+            except (OSError, sqlite3.Error) as e:
+                print("Info : Could not open catalog " + dbPath + " : " + str(e))
+        self.dbPath = ":memory:"
+        connection = sqlite3.connect(self.dbPath, check_same_thread=False)
+        self.initTables(connection)
+        return connection
+
+    def initTables(self, connection):
+        """Create catalog tables, drop them if they come from another version"""
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        # an up to date database is only read, other sessions are not locked out
+        if version == SCHEMA_VERSION:
+            return
+        connection.execute("DROP TABLE IF EXISTS directories")
+        connection.execute("DROP TABLE IF EXISTS entries")
+        connection.execute("DROP TABLE IF EXISTS terms")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, mtime REAL)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "path TEXT PRIMARY KEY, parent TEXT, name TEXT, itemType TEXT, "
+            "thumbnail TEXT, owner TEXT, date TEXT, content TEXT, frameRange TEXT, "
+            "objects TEXT, boneNames TEXT, bonesSelection INTEGER, mtime REAL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent)"
+        )
+        # few items are being written, their directories are found without a full scan
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS entries_incomplete ON entries (parent) "
+            "WHERE mtime IS NULL"
+        )
+        # inverted index of the items metadata, searched by term prefix
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS terms (term TEXT, field TEXT, path TEXT, "
+            "PRIMARY KEY (term, field, path)) WITHOUT ROWID"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS terms_path ON terms (path)")
+        connection.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+        connection.commit()
+
+    def contains(self, path):
+        """Return True if given path is the ROOT or one of its sub folders"""
+        rootPath = os.path.normcase(os.path.normpath(self.rootPath))
+        path = os.path.normcase(os.path.normpath(path))
+        return path == rootPath or path.startswith(rootPath.rstrip(os.sep) + os.sep)
+
+    def relPath(self, path):
+        """Return path relative to the ROOT, with / separators ("" for the ROOT)"""
+        relPath = os.path.relpath(path, self.rootPath).replace("\\", "/")
+        if relPath == ".":
+            return ""
+        return relPath
+
+    def absPath(self, relPath):
+        """Return absolute path of given ROOT relative path"""
+        if not relPath:
+            return self.rootPath
+        return os.path.join(self.rootPath, *relPath.split("/"))
+
+    #############################
+    # Update from disk
+    #############################
+
+    def update(
+        self,
+        path=None,
+        recursive=True,
+        isCancelled=None,
+        incompleteDirectories=None,
+        checkItems=False,
+    ):
+        """Rescan directories which mtime changed (or items if checkItems), return their paths"""
+        startPath = self.relPath(path) if path else ""
+        with self._lock:
+            if incompleteDirectories is None:
+                incompleteDirectories = self.getIncompleteDirectories()
+            # disk is read by the scanner threads, database is only used here
+            scanner = GaoLibScanner(
+                self.rootPath,
+                knownMtimes=self.getKnownMtimes(startPath, recursive),
+                knownEntries=self.getKnownEntries(startPath, recursive),
+                incompleteDirectories=incompleteDirectories,
+                maxWorkers=self.maxWorkers,
+                checkItems=checkItems,
+            )
+        # the lock is not held while reading the disk, other threads can query
+        changed = []
+        # directories scanned before a cancel are kept, the others are scanned next time
+        for result in scanner.scan(
+            startPath, recursive=recursive, isCancelled=isCancelled
+        ):
+            with self._lock:
+                if result.mtime is None:
+                    # directory vanished
+                    self.removeEntry(result.relPath)
+                elif result.changed:
+                    self.storeDirectory(result)
+                    changed.append(self.absPath(result.relPath))
+                else:
+                    continue
+                # committed one directory at a time, the shared database is not
+                # locked for other sessions during the whole scan
+                self._connection.commit()
+        if not startPath and recursive and not (isCancelled and isCancelled()):
+            self.fullyScanned = True
+        return changed
+
+    def updateDirectories(
+        self, paths, recursive=False, isCancelled=None, checkItems=False
+    ):
+        """Rescan given directories which mtime changed, return the changed paths"""
+        # items being written are looked for once for all directories
+        with self._lock:
+            incompleteDirectories = self.getIncompleteDirectories()
+        changed = []
+        for path in paths:
+            if isCancelled is not None and isCancelled():
+                break
+            changed += self.update(
+                path,
+                recursive=recursive,
+                isCancelled=isCancelled,
+                incompleteDirectories=incompleteDirectories,
+                checkItems=checkItems,
+            )
+        return changed
+
+    def getSubPathCondition(self, column, relPath, recursive):
+        """Return sql condition and parameters selecting relPath (and its sub paths)"""
+        if not recursive:
+            return column + " = ?", (relPath,)
+        if not relPath:
+            return "1", ()
+        return (
+            "(%s = ? OR (%s >= ? AND %s < ?))" % (column, column, column),
+            (relPath, relPath + "/", relPath + "0"),
+        )
+
+    def getKnownMtimes(self, relPath, recursive):
+        """Return dict of relative path : mtime of the scanned directories"""
+        condition, parameters = self.getSubPathCondition("path", relPath, recursive)
+        return dict(
+            self._connection.execute(
+                "SELECT path, mtime FROM directories WHERE " + condition, parameters
+            )
+        )
+
+    def getKnownEntries(self, relPath, recursive):
+        """Return dict of relative parent path : {name : (itemType, mtime)}"""
+        condition, parameters = self.getSubPathCondition("parent", relPath, recursive)
+        knownEntries = {}
+        for parent, name, itemType, mtime in self._connection.execute(
+            "SELECT parent, name, itemType, mtime FROM entries WHERE " + condition,
+            parameters,
+        ):
+            if parent not in knownEntries.keys():
+                knownEntries[parent] = {}
+            knownEntries[parent][name] = (itemType, mtime)
+        return knownEntries
+
+    def getIncompleteDirectories(self):
+        """Return relative paths of directories containing items still being written"""
+        rows = self._connection.execute(
+            "SELECT DISTINCT parent FROM entries WHERE mtime IS NULL"
+        )
+        return set([row[0] for row in rows])
+
+    def getIncompletePaths(self):
+        """Return paths of directories containing items still being written"""
+        with self._lock:
+            return [self.absPath(path) for path in self.getIncompleteDirectories()]
+
+    def invalidate(self, path):
+        """Force given directory to be listed again at next update"""
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM directories WHERE path = ?", (self.relPath(path),)
+            )
+            self._connection.commit()
+
+    def storeDirectory(self, result):
+        """Store the DirectoryScan of one modified directory in the catalog"""
+        relPath = result.relPath
+        foundNames = set(result.keptNames)
+        for entry in result.entries:
+            foundNames.add(entry.name)
+            self.storeEntry(relPath, entry)
+        knownNames = [
+            row[0]
+            for row in self._connection.execute(
+                "SELECT name FROM entries WHERE parent = ?", (relPath,)
+            )
+        ]
+        for name in set(knownNames) - foundNames:
+            self.removeEntry(relPath + "/" + name if relPath else name)
+        # the folder thumbnail may have changed too
+        if relPath:
+            self._connection.execute(
+                "UPDATE entries SET thumbnail = ?, mtime = ? WHERE path = ?",
+                (result.thumbnail, result.mtime, relPath),
+            )
+        self._connection.execute(
+            "INSERT OR REPLACE INTO directories (path, mtime) VALUES (?, ?)",
+            (relPath, result.mtime),
+        )
+
+    def storeEntry(self, parentRelPath, entry):
+        """Store one ScannedEntry in the catalog"""
+        infos = entry.infos
+        relPath = parentRelPath + "/" + entry.name if parentRelPath else entry.name
+        self._connection.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                relPath,
+                parentRelPath,
+                entry.name,
+                infos["itemType"],
+                entry.thumbnail,
+                infos["owner"],
+                infos["date"],
+                infos["content"],
+                infos["frameRange"],
+                json.dumps(infos["objects"]),
+                json.dumps(infos["boneNames"]),
+                int(infos["bonesSelection"]),
+                entry.mtime,
+            ),
+        )
+        self._connection.execute("DELETE FROM terms WHERE path = ?", (relPath,))
+        if infos["itemType"] != "FOLDER":
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO terms VALUES (?, ?, ?)",
+                [
+                    (term, field, relPath)
+                    for field, term in self.getEntryTerms(entry.name, infos)
+                ],
+            )
+
+    def getEntryTerms(self, name, infos):
+        """Return set of (field, term) indexing the infos of one item"""
+        values = [
+            ("name", os.path.splitext(name)[0]),
+            ("user", infos["owner"]),
+            ("date", infos["date"]),
+            ("type", infos["itemType"]),
+        ]
+        values += [("bone", boneName) for boneName in infos["boneNames"]]
+        values += [("object", objectName) for objectName in infos["objects"]]
+        terms = set()
+        for field, value in values:
+            for term in getSearchTerms(value):
+                terms.add((field, term))
+        return terms
+
+    def removeEntry(self, relPath):
+        """Remove entry and all its descendants from the catalog"""
+        # "0" is the character following "/", this selects all sub paths
+        for table in ["entries", "directories", "terms"]:
+            self._connection.execute(
+                "DELETE FROM %s WHERE path = ? OR (path >= ? AND path < ?)" % table,
+                (relPath, relPath + "/", relPath + "0"),
+            )
+
+    #############################
+    # Queries
+    #############################
+
+    def toEntry(self, row):
+        """Convert a database row to a CatalogEntry"""
+        return CatalogEntry(
+            path=self.absPath(row[0]),
+            name=row[1],
+            itemType=row[2],
+            thumbnail=row[3],
+            owner=row[4],
+            date=row[5],
+            content=row[6],
+            frameRange=row[7],
+            objects=json.loads(row[8]),
+            boneNames=json.loads(row[9]),
+            bonesSelection=bool(row[10]),
+            mtime=row[11],
+        )
+
+    def select(self, condition, parameters, light=False):
+        """Return catalog entries (CatalogRecord if light) matching given sql condition"""
+        if light:
+            columns = "path, name, itemType, thumbnail, mtime, owner, date"
+        else:
+            columns = (
+                "path, name, itemType, thumbnail, owner, date, content, "
+                "frameRange, objects, boneNames, bonesSelection, mtime"
+            )
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT " + columns + " FROM entries WHERE " + condition,
+                parameters,
+            ).fetchall()
+        if light:
+            return [CatalogRecord(self.absPath(row[0]), *row[1:]) for row in rows]
+        return [self.toEntry(row) for row in rows]
+
+    def getEntries(self, paths):
+        """Return dict of path : entry for given paths found in the catalog"""
+        relPaths = [self.relPath(path) for path in paths]
+        entries = {}
+        # sqlite limits the number of parameters of one query
+        for start in range(0, len(relPaths), 500):
+            chunk = relPaths[start : start + 500]
+            condition = "path IN (%s)" % ", ".join(["?"] * len(chunk))
+            for entry in self.select(condition, chunk):
+                entries[entry.path] = entry
+        return entries
+
+    def getChildren(self, path, light=False):
+        """Return entries directly contained in given folder"""
+        return self.select("parent = ?", (self.relPath(path),), light=light)
+
+    def getItemMtimes(self, path):
+        """Return dict of name : mtime of the complete items directly contained in given folder"""
+        with self._lock:
+            return dict(
+                self._connection.execute(
+                    "SELECT name, mtime FROM entries WHERE parent = ? "
+                    "AND itemType != 'FOLDER' AND mtime IS NOT NULL",
+                    (self.relPath(path),),
+                )
+            )
+
+    def getExpandablePaths(self, path, withItems=False):
+        """Return paths of the sub folders of given folder which have tree children"""
+        if withItems:
+            childCondition = "(c.itemType != 'FOLDER' OR c.name != 'trash')"
+        else:
+            childCondition = "c.itemType = 'FOLDER' AND c.name != 'trash'"
+        # folders never listed may have children too
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT e.path FROM entries e "
+                "WHERE e.parent = ? AND e.itemType = 'FOLDER' AND ("
+                "NOT EXISTS (SELECT 1 FROM directories d WHERE d.path = e.path) "
+                "OR EXISTS (SELECT 1 FROM entries c WHERE c.parent = e.path AND "
+                + childCondition
+                + "))",
+                (self.relPath(path),),
+            ).fetchall()
+        return set([self.absPath(row[0]) for row in rows])
+
+    def search(self, text, light=False):
+        """Return items which terms start with every word of given query"""
+        conditions = []
+        parameters = []
+        for field, word in parseSearchQuery(text):
+            condition = "term >= ? AND term < ?"
+            wordParameters = [word, word + LAST_CHARACTER]
+            if field is not None:
+                condition += " AND field = ?"
+                wordParameters.append(field)
+            conditions.append(
+                "path IN (SELECT path FROM terms WHERE " + condition + ")"
+            )
+            parameters += wordParameters
+        if not conditions:
+            return []
+        return self.select(" AND ".join(conditions), parameters, light=light)
+
+    def getDescendantItems(self, path, light=False):
+        """Return item entries (not folders) contained in given folder and its sub folders"""
+        relPath = self.relPath(path)
+        if not relPath:
+            return self.select("itemType != 'FOLDER'", (), light=light)
+        return self.select(
+            "itemType != 'FOLDER' AND path >= ? AND path < ?",
+            (relPath + "/", relPath + "0"),
+            light=light,
+        )
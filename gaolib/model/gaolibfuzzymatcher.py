@@ -0,0 +1,138 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+import re
+from collections import Counter
+
+# Part of the search text trigrams a name must contain to be similar
+MIN_SIMILARITY = 0.5
+
+
+def normalizeName(name):
+    """Return lowercase name without separators ("walk_cyc" and "walkCyc" are equal)"""
+    return re.sub(r"[\W_]+", "", name.lower())
+
+
+def getTrigrams(name):
+    """Return set of trigrams of a normalized name, padded so its start counts more"""
+    name = "  " + name
+    return set([name[i : i + 3] for i in range(len(name) - 2)])
+
+
+class GaoLibFuzzyMatcher(object):
+    """Trigram index of names, finds the names similar to a search text"""
+
+    def __init__(self, names=[]):
+        # normalized names, a name key is its index in this list
+        self.names = []
+        self.trigramCounts = []
+        # trigram : keys of the names containing it
+        self.postings = {}
+        # last searched text, keys of the names containing it and number of names then,
+        # an extended text is only looked for in these names and the added ones
+        self.lastText = None
+        self.lastKeys = set()
+        self.lastCount = 0
+        for name in names:
+            self.addName(name)
+
+    def addName(self, name):
+        """Add name to the index, return its key"""
+        key = len(self.names)
+        name = normalizeName(name)
+        trigrams = getTrigrams(name)
+        self.names.append(name)
+        self.trigramCounts.append(len(trigrams))
+        for trigram in trigrams:
+            if trigram not in self.postings.keys():
+                self.postings[trigram] = []
+            self.postings[trigram].append(key)
+        return key
+
+    def search(self, text, fuzzy=True, minSimilarity=MIN_SIMILARITY):
+        """Return list of (score, key) of the names containing text (else similar if fuzzy), best first"""
+        text = normalizeName(text)
+        if not text:
+            return []
+        results = [
+            (self.getContainingScore(text, key), key)
+            for key in self.getContainingKeys(text)
+        ]
+        if not results and fuzzy:
+            # text may have a typo, names sharing most of its trigrams are given
+            results = self.getSimilar(text, minSimilarity)
+        results.sort(key=lambda result: (-result[0], self.names[result[1]]))
+        return results
+
+    def getContainingKeys(self, text):
+        """Return set of keys of the names containing normalized text"""
+        if self.lastText is not None and self.lastText in text:
+            # extended text, names not containing the previous one are skipped
+            candidates = self.lastKeys.union(range(self.lastCount, len(self.names)))
+        else:
+            candidates = self.getTrigramCandidates(text)
+        keys = set([key for key in candidates if text in self.names[key]])
+        self.lastText = text
+        self.lastKeys = keys
+        self.lastCount = len(self.names)
+        return keys
+
+    def getTrigramCandidates(self, text):
+        """Return keys of the names having every trigram of text, all keys if text is short"""
+        if len(text) < 3:
+            return range(len(self.names))
+        postings = []
+        for i in range(len(text) - 2):
+            trigram = text[i : i + 3]
+            if trigram not in self.postings.keys():
+                return set()
+            postings.append(self.postings[trigram])
+        # smallest posting first, intersections only get smaller
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+        return candidates
+
+    def getContainingScore(self, text, key):
+        """Return score of a name containing text, prefixes then shortest names first"""
+        name = self.names[key]
+        score = 1.0 + 0.5 * len(text) / len(name)
+        if name.startswith(text):
+            score += 0.5
+        return score
+
+    def getSimilar(self, text, minSimilarity):
+        """Return list of (score, key) of the names sharing enough trigrams with text"""
+        trigrams = getTrigrams(text)
+        # number of trigrams shared with text, by name key
+        shared = Counter()
+        for trigram in trigrams:
+            if trigram in self.postings.keys():
+                shared.update(self.postings[trigram])
+        results = []
+        for key, count in shared.items():
+            containment = count / len(trigrams)
+            if containment < minSimilarity:
+                continue
+            # names of the same length as text come first
+            jaccard = count / (len(trigrams) + self.trigramCounts[key] - count)
+            # always below the score of a name containing text
+            results.append((0.8 * containment + 0.2 * jaccard, key))
+        return results
@@ -19,12 +19,157 @@ __author__ = "Anne Beurard"
 
 import json
 import os
+from collections import namedtuple
+
+ITEM_TYPES = {
+    "pose": ("POSE", "pose.json"),
+    "anim": ("ANIMATION", "animation.json"),
+    "selection": ("SELECTION SET", "selection_set.json"),
+    "constraint": ("CONSTRAINT SET", "constraint_set.json"),
+    "multi_pose": ("MULTI POSE", "multi_pose.json"),
+    "multi_anim": ("MULTI ANIMATION", "multi_animation.json"),
+}
+# Small file holding what the list view displays, written next to the item json.
+# It must not end with .json, the first json file of an item is its data file.
+SUMMARY_NAME = "summary.gaolib"
+SUMMARY_VERSION = 1
+SUMMARY_KEYS = ["user", "date", "content", "frameRange", "objects", "boneNames"]
+
+# Light description of a list view item, its GaoLibItem is built when displayed
+GaoLibItemRecord = namedtuple(
+    "GaoLibItemRecord",
+    ["name", "thumbpath", "path", "itemType", "mtime", "owner", "date"],
+)
+# Orders of the list view, see getSortKey
+SORT_MODES = ["name", "date", "owner", "type"]
+
+
+def getDisplayName(itemName):
+    """Return name displayed for given item folder name (without item suffix)"""
+    if itemName.endswith(".anim"):
+        itemName = itemName[:-5]
+    elif itemName.endswith(".selection"):
+        itemName = itemName[:-10]
+    elif itemName.endswith(".pose"):
+        itemName = itemName[:-5]
+    elif itemName.endswith(".constraint"):
+        itemName = itemName[:-11]
+    elif itemName.endswith(".multi_pose"):
+        itemName = itemName[:-11]
+    elif itemName.endswith(".multi_anim"):
+        itemName = itemName[:-11]
+    # if len(itemName) > 18:
+    #     itemName = itemName[:15] + "..."
+    return itemName
+
+
+def getDateNumber(date):
+    """Return yyyymmdd number of a dd/mm/yyyy date, 0 if unknown"""
+    try:
+        day, month, year = [int(part) for part in date.split("/")]
+    except ValueError:
+        return 0
+    return year * 10000 + month * 100 + day
+
+
+def getSortKey(record, sortMode="name"):
+    """Return key of given GaoLibItemRecord in given sort mode, names are casefolded"""
+    nameKey = (getDisplayName(record.name).casefold(), record.path)
+    if sortMode == "date":
+        # newest first
+        return (-getDateNumber(record.date),) + nameKey
+    elif sortMode == "owner":
+        return (record.owner.casefold(),) + nameKey
+    elif sortMode == "type":
+        # folders first
+        return (record.itemType != "FOLDER", record.itemType) + nameKey
+    return nameKey
+
+
+def getItemType(name):
+    """Return item type and json file name of given item folder name"""
+    if "." in name:
+        suffix = name.split(".")[-1]
+        if suffix in ITEM_TYPES.keys():
+            return ITEM_TYPES[suffix]
+    return "FOLDER", None
+
+
+def writeItemSummary(path, metadata):
+    """Write summary file of item at path from the metadata of its json file"""
+    summary = {"version": SUMMARY_VERSION}
+    for key in SUMMARY_KEYS:
+        if key in metadata.keys():
+            summary[key] = metadata[key]
+    # written aside then renamed, so readers never get a partial file
+    tempPath = os.path.join(path, SUMMARY_NAME + ".tmp")
+    with open(tempPath, "w") as file:
+        json.dump(summary, file, sort_keys=True)
+    os.replace(tempPath, os.path.join(path, SUMMARY_NAME))
+
+
+def readItemSummary(path):
+    """Return metadata stored in summary file of item at path, None if missing"""
+    try:
+        with open(os.path.join(path, SUMMARY_NAME)) as file:
+            summary = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if summary.get("version") != SUMMARY_VERSION:
+        return None
+    return summary
+
+
+def readItemInfos(name, path):
+    """Read item metadata from its summary (or its json file), return a dict of infos"""
+    itemType, jsonName = getItemType(name)
+    infos = {
+        "itemType": itemType,
+        "owner": "",
+        "date": "",
+        "content": "",
+        "frameRange": "",
+        "objects": [],
+        "boneNames": [],
+        "bonesSelection": False,
+    }
+    if jsonName:
+        jsonPath = os.path.join(path, jsonName)
+        metadata = readItemSummary(path)
+        if metadata is None and os.path.exists(jsonPath):
+            # items saved before summaries existed, the whole json is parsed
+            with open(jsonPath) as file:
+                itemdata = json.load(file)
+            if "metadata" in itemdata.keys():
+                metadata = itemdata["metadata"]
+            else:
+                metadata = {}
+        if metadata is not None:
+            infos["owner"] = "Unknown"
+            infos["date"] = "Unknown"
+            infos["content"] = "Unknown"
+            infos["frameRange"] = "Unknown"
+
+            if "user" in metadata.keys():
+                infos["owner"] = metadata["user"]
+            if "date" in metadata.keys():
+                infos["date"] = metadata["date"]
+            if "content" in metadata.keys():
+                infos["content"] = metadata["content"]
+            if "frameRange" in metadata.keys():
+                infos["frameRange"] = metadata["frameRange"]
+            if "boneNames" in metadata.keys():
+                infos["bonesSelection"] = True
+                infos["boneNames"] = metadata["boneNames"]
+            if "objects" in metadata.keys():
+                infos["objects"] = metadata["objects"]
+    return infos
 
 
 class GaoLibItem(object):
     """Description of one item of the list view"""
 
-    def __init__(self, name="", thumbpath=None, path=None):
+    def __init__(self, name="", thumbpath=None, path=None, infos=None):
         self.name = name
         self.thumbpath = thumbpath
         # if self.thumbpath is None or not os.path.isfile(self.thumbpath):
@@ -37,59 +182,21 @@ class GaoLibItem(object):
         #     self.stamped = stamped
         self.path = path
         self.bonesSelection = False
-        self.getItemInfos()
+        if infos is None:
+            self.getItemInfos()
+        else:
+            self.setItemInfos(infos)
 
     def getItemInfos(self):
         """Read json infos from json"""
-        if self.name.endswith(".pose"):
-            jsonPath = os.path.join(self.path, "pose.json")
-            self.itemType = "POSE"
-        elif self.name.endswith(".anim"):
-            jsonPath = os.path.join(self.path, "animation.json")
-            self.itemType = "ANIMATION"
-        elif self.name.endswith(".selection"):
-            jsonPath = os.path.join(self.path, "selection_set.json")
-            self.itemType = "SELECTION SET"
-        elif self.name.endswith(".constraint"):
-            jsonPath = os.path.join(self.path, "constraint_set.json")
-            self.itemType = "CONSTRAINT SET"
-        elif self.name.endswith(".multi_pose"):
-            jsonPath = os.path.join(self.path, "multi_pose.json")
-            self.itemType = "MULTI POSE"
-        elif self.name.endswith(".multi_anim"):
-            jsonPath = os.path.join(self.path, "multi_animation.json")
-            self.itemType = "MULTI ANIMATION"
-        else:
-            jsonPath = None
-            self.itemType = "FOLDER"
-
-        self.owner = ""
-        self.date = ""
-        self.content = ""
-        self.frameRange = ""
-        self.objects = []
-
-        if jsonPath:
-            if os.path.exists(jsonPath):
-                with open(jsonPath) as file:
-                    itemdata = json.load(file)
-
-                self.owner = "Unknown"
-                self.date = "Unknown"
-                self.content = "Unknown"
-                self.frameRange = "Unknown"
-                self.objects = []
-
-                if "metadata" in itemdata.keys():
-                    if "user" in itemdata["metadata"].keys():
-                        self.owner = itemdata["metadata"]["user"]
-                    if "date" in itemdata["metadata"].keys():
-                        self.date = itemdata["metadata"]["date"]
-                    if "content" in itemdata["metadata"].keys():
-                        self.content = itemdata["metadata"]["content"]
-                    if "frameRange" in itemdata["metadata"].keys():
-                        self.frameRange = itemdata["metadata"]["frameRange"]
-                    if "boneNames" in itemdata["metadata"].keys():
-                        self.bonesSelection = True
-                    if "objects" in itemdata["metadata"].keys():
-                        self.objects = itemdata["metadata"]["objects"]
+        self.setItemInfos(readItemInfos(self.name, self.path))
+
+    def setItemInfos(self, infos):
+        """Set item infos from given dict (see readItemInfos)"""
+        self.itemType = infos["itemType"]
+        self.owner = infos["owner"]
+        self.date = infos["date"]
+        self.content = infos["content"]
+        self.frameRange = infos["frameRange"]
+        self.objects = infos["objects"]
+        self.bonesSelection = infos["bonesSelection"]
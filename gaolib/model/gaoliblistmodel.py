@@ -17,19 +17,80 @@
 
 __author__ = "Anne Beurard"
 
+import bisect
+
 from PySide6 import QtCore, QtGui
 
+from gaolib.model.gaolibfuzzymatcher import GaoLibFuzzyMatcher
+from gaolib.model.gaolibitem import GaoLibItem, getDisplayName, getSortKey
+
+# Number of GaoLibItems built at once when a row is displayed
+BATCH_SIZE = 64
+# Role returning the GaoLibItemRecord of a row, without building its GaoLibItem
+RecordRole = QtCore.Qt.UserRole + 1
+
 
 class GaoLibListModel(QtCore.QAbstractItemModel):
-    """Model for List view"""
+    """Model for List view, holds GaoLibItemRecords and builds GaoLibItems on demand"""
 
-    def __init__(self, items={}, parent=None):
+    def __init__(self, items={}, parent=None, loadCallback=None, sortMode="name"):
         super(GaoLibListModel, self).__init__(parent)
-        self.__items = items
+        self.sortMode = sortMode
+        self.setRows([items[key] for key in sorted(items.keys())])
+        # path : GaoLibItem of the rows already displayed
+        self.__loadedItems = {}
+        # function returning the GaoLibItems of given records
+        self.loadCallback = loadCallback
+
+    def setRows(self, items):
+        """Store given records sorted, with their sort keys and searched names"""
+        keyedItems = sorted(
+            [(self.getSortKey(item), item) for item in items],
+            key=lambda keyedItem: keyedItem[0],
+        )
+        # rows are kept sorted, views show them in this order
+        self.__sortKeys = [keyedItem[0] for keyedItem in keyedItems]
+        self.__items = [keyedItem[1] for keyedItem in keyedItems]
+        # lowercase displayed names, row by row, used by search
+        self.__lowerNames = [getDisplayName(item.name).lower() for item in self.__items]
+        # trigram index of the displayed names (keys are rows), built when searched
+        self.__matcher = None
 
-    def rowCount(self, parent):
+    def setItems(self, items):
+        """Replace all rows with given items (dict of row : GaoLibItemRecord)"""
+        self.beginResetModel()
+        self.setRows([items[key] for key in sorted(items.keys())])
+        self.__loadedItems = {}
+        self.endResetModel()
+
+    def getSortKey(self, item):
+        """Return key of given record in current sort mode"""
+        return getSortKey(item, self.sortMode)
+
+    def setSortMode(self, sortMode):
+        """Sort rows in given mode (one of SORT_MODES), keys are computed once per row"""
+        if sortMode == self.sortMode:
+            return
+        self.layoutAboutToBeChanged.emit()
+        oldItems = self.__items
+        self.sortMode = sortMode
+        self.setRows(oldItems)
+        # selection and current row follow their items
+        newRows = {}
+        for row, item in enumerate(self.__items):
+            newRows[item.path] = row
+        for index in self.persistentIndexList():
+            row = newRows[oldItems[index.row()].path]
+            self.changePersistentIndex(
+                index, self.createIndex(row, index.column(), self.__items[row])
+            )
+        self.layoutChanged.emit()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
         """length of the list (number of items)"""
-        return len(self.__items.keys())
+        if parent.isValid():
+            return 0
+        return len(self.__items)
 
     def columnCount(self, parent):
         """List is a table of dimension one"""
@@ -49,28 +110,14 @@ class GaoLibListModel(QtCore.QAbstractItemModel):
 
         row = index.row()
         col = index.column()
+        # record holds name, type and thumbnail, enough to sort, filter and draw
         item = self.__items[row]
 
         if role == QtCore.Qt.DisplayRole:
-            itemName = item.name
-            if itemName.endswith(".anim"):
-                itemName = itemName[:-5]
-            elif itemName.endswith(".selection"):
-                itemName = itemName[:-10]
-            elif itemName.endswith(".pose"):
-                itemName = itemName[:-5]
-            elif itemName.endswith(".constraint"):
-                itemName = itemName[:-11]
-            elif itemName.endswith(".multi_pose"):
-                itemName = itemName[:-11]
-            elif itemName.endswith(".multi_anim"):
-                itemName = itemName[:-11]
-            # if len(itemName) > 18:
-            #     itemName = itemName[:15] + "..."
-            return itemName
+            return getDisplayName(item.name)
 
         elif role == QtCore.Qt.DecorationRole:
-            return QtGui.QIcon(QtGui.QPixmap(item.stamped).scaled(300, 300))
+            return QtGui.QIcon(QtGui.QPixmap(item.thumbpath).scaled(300, 300))
         elif role == QtCore.Qt.BackgroundRole:
             if item.itemType in ["POSE", "MULTI POSE"]:
                 return QtGui.QColor(200, 125, 42, 200)
@@ -83,16 +130,129 @@ class GaoLibListModel(QtCore.QAbstractItemModel):
         elif role == QtCore.Qt.ToolTipRole:
             return item.name.split(".")[0]
         elif role == QtCore.Qt.UserRole:
+            return self.getItem(row)
+        elif role == RecordRole:
             return item
 
+    def getItem(self, row):
+        """Return GaoLibItem of given row, build it with the rows around if needed"""
+        record = self.__items[row]
+        if record.path not in self.__loadedItems.keys():
+            self.loadBatch(row)
+        return self.__loadedItems[record.path]
+
+    def loadBatch(self, row):
+        """Build GaoLibItems of the batch of rows containing given row"""
+        start = row - row % BATCH_SIZE
+        records = [
+            record
+            for record in self.__items[start : start + BATCH_SIZE]
+            if record.path not in self.__loadedItems.keys()
+        ]
+        if self.loadCallback is not None:
+            items = self.loadCallback(records)
+        else:
+            items = [
+                GaoLibItem(record.name, record.thumbpath, record.path)
+                for record in records
+            ]
+        for item in items:
+            self.__loadedItems[item.path] = item
+
     def index(self, row, column, parent):
         """Return the index object of an item given its row, column and parent"""
 
-        if row in self.__items.keys():
+        if 0 <= row < len(self.__items):
             childItem = self.__items[row]
             if childItem:
                 index = self.createIndex(row, column, childItem)
                 return index
         else:
-            print("No key " + str(row) + " in " + str(self.__items))
+            print("No row " + str(row) + " in " + str(self.__items))
+        return QtCore.QModelIndex()
+
+    def parent(self, index):
+        """List items have no parent"""
         return QtCore.QModelIndex()
+
+    def getLowerNames(self):
+        """Return lowercase displayed names, row by row"""
+        return self.__lowerNames
+
+    def getMatcher(self):
+        """Return GaoLibFuzzyMatcher of the displayed names, keys are rows"""
+        if self.__matcher is None:
+            self.__matcher = GaoLibFuzzyMatcher(self.__lowerNames)
+        return self.__matcher
+
+    def appendItems(self, items):
+        """Add given list of GaoLibItemRecord, at the end if they follow the last row"""
+        if not items:
+            return
+        keyedItems = sorted(
+            [(self.getSortKey(item), item) for item in items],
+            key=lambda keyedItem: keyedItem[0],
+        )
+        if self.__sortKeys and keyedItems[0][0] < self.__sortKeys[-1]:
+            # items were listed in another order, each one goes to its row
+            for key, item in keyedItems:
+                self.insertItem(item, key)
+            return
+        row = len(self.__items)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row + len(items) - 1)
+        self.__sortKeys += [keyedItem[0] for keyedItem in keyedItems]
+        self.__items += [keyedItem[1] for keyedItem in keyedItems]
+        self.__lowerNames += [
+            getDisplayName(keyedItem[1].name).lower() for keyedItem in keyedItems
+        ]
+        if self.__matcher is not None:
+            for name in self.__lowerNames[row:]:
+                self.__matcher.addName(name)
+        self.endInsertRows()
+
+    def insertItem(self, item, key):
+        """Insert given GaoLibItemRecord at its sorted row"""
+        row = bisect.bisect_right(self.__sortKeys, key)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.__sortKeys.insert(row, key)
+        self.__items.insert(row, item)
+        self.__lowerNames.insert(row, getDisplayName(item.name).lower())
+        if self.__matcher is not None:
+            if row == len(self.__items) - 1:
+                self.__matcher.addName(self.__lowerNames[row])
+            else:
+                # following rows moved, their keys changed
+                self.__matcher = None
+        self.endInsertRows()
+
+    def updateItems(self, items):
+        """Apply differences with given items (dict of row : GaoLibItemRecord) row by row"""
+        newItems = {}
+        for key in sorted(items.keys()):
+            newItems[items[key].path] = items[key]
+        # Remove vanished items and items changing place, last rows first
+        for row in reversed(range(len(self.__items))):
+            newItem = newItems.get(self.__items[row].path)
+            if newItem is None or self.getSortKey(newItem) != self.__sortKeys[row]:
+                self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+                self.__loadedItems.pop(self.__items[row].path, None)
+                del self.__sortKeys[row]
+                del self.__items[row]
+                del self.__lowerNames[row]
+                self.__matcher = None
+                self.endRemoveRows()
+        # Update modified items
+        knownRows = {}
+        for row, item in enumerate(self.__items):
+            knownRows[item.path] = row
+            newItem = newItems[item.path]
+            if newItem != item:
+                # item infos are read again when displayed
+                self.__loadedItems.pop(item.path, None)
+                self.__items[row] = newItem
+                index = self.index(row, 0, QtCore.QModelIndex())
+                self.dataChanged.emit(index, index)
+        # Add new items at their sorted row
+        for path, item in newItems.items():
+            if path not in knownRows.keys():
+                self.insertItem(item, self.getSortKey(item))
@@ -0,0 +1,150 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+import os
+
+from gaolib.model.catalogupdatetask import CatalogUpdateTask
+from gaolib.model.gaolibtreeitem import GaoLibTreeItem
+
+
+class GaoLibRefreshEngine(object):
+    """Apply the changes found on disk to the tree model, row by row"""
+
+    def __init__(self, mainWin):
+        self.mainWindow = mainWin
+        # False while the tree is filled from catalogs already updated from disk
+        self.updateOnFetch = True
+
+    def refresh(self, path=None, recursive=True):
+        """Rescan modified directories under path (all ROOTs if None), return them"""
+        changedPaths = []
+        for catalog in self.mainWindow.catalogs.values():
+            if path is None:
+                changed = catalog.update()
+            elif catalog.contains(path):
+                changed = catalog.update(path, recursive=recursive)
+            else:
+                continue
+            # directories are given parents first, new folders exist when synced
+            for directoryPath in changed:
+                self.syncTreeElement(catalog, directoryPath)
+            changedPaths += changed
+        return changedPaths
+
+    def syncChangedPaths(self, paths):
+        """Apply directories already updated in their catalog to the tree"""
+        for path in paths:
+            catalog = self.mainWindow.getCatalog(path)
+            if catalog is not None:
+                self.syncTreeElement(catalog, path)
+
+    def isInTree(self, entry):
+        """Return True if the catalog entry is displayed in the tree view"""
+        if entry.itemType == "FOLDER":
+            return entry.name != "trash"
+        return self.mainWindow.itemsInTree
+
+    def syncTreeElement(self, catalog, directoryPath):
+        """Insert and remove children of the tree element of given directory"""
+        treeModel = self.mainWindow.treeModel
+        elem = treeModel.getElemWithPath(directoryPath)
+        if elem is None or elem.isItem:
+            return
+        # Folder thumbnail
+        thumbnailPath = os.path.join(elem.path, "thumbnail.png")
+        hasThumbnail = os.path.isfile(thumbnailPath)
+        if (elem.thumbnail is not None) != hasThumbnail:
+            elem.thumbnail = thumbnailPath if hasThumbnail else None
+            treeModel.refreshElement(elem)
+        # Children
+        entries = {}
+        for entry in catalog.getChildren(directoryPath):
+            if self.isInTree(entry):
+                entries[entry.name] = entry
+        if not elem.fetched:
+            # children are listed when elem is expanded, only update its arrow
+            expandable = len(entries) > 0
+            if elem.expandable != expandable:
+                elem.expandable = expandable
+                treeModel.refreshElement(elem)
+            return
+        for child in list(elem.children):
+            if child.name not in entries.keys():
+                treeModel.removeElement(child)
+        childNames = [child.name for child in elem.children]
+        newNames = [name for name in entries.keys() if name not in childNames]
+        if newNames:
+            expandablePaths = catalog.getExpandablePaths(
+                directoryPath, self.mainWindow.itemsInTree
+            )
+            for name in newNames:
+                entry = entries[name]
+                newItem = self.createTreeItem(
+                    entry, elem, entry.path in expandablePaths
+                )
+                treeModel.addElement(newItem, elem)
+
+    def createTreeItem(self, entry, parentElem, expandable):
+        """Return a new tree item for given catalog entry"""
+        # tree displays thumbnail.png, catalog keeps thumbnail_stamped.png if both exist
+        if entry.thumbnail == "thumbnail.png":
+            hasThumbnail = True
+        elif entry.thumbnail:
+            # checked on disk by the tree item
+            hasThumbnail = None
+        else:
+            hasThumbnail = False
+        treeItem = GaoLibTreeItem(
+            entry.name,
+            ancestors=parentElem.ancestors + [parentElem],
+            path=entry.path,
+            hasThumbnail=hasThumbnail,
+        )
+        if not treeItem.isItem:
+            treeItem.expandable = expandable
+        return treeItem
+
+    def getTreeChildren(self, elem):
+        """Return tree items for the children of elem, called when elem is expanded"""
+        if not elem.path:
+            return []
+        catalog = self.mainWindow.getCatalog(elem.path)
+        if catalog is None:
+            return []
+        # children come from the catalog at once, this directory is listed again
+        # in a worker and its changes are synced when scanned
+        if self.updateOnFetch:
+            self.mainWindow.listingPool.start(
+                CatalogUpdateTask(
+                    [catalog],
+                    self.mainWindow.refreshSignals,
+                    paths=[elem.path],
+                    recursive=False,
+                )
+            )
+        expandablePaths = catalog.getExpandablePaths(
+            elem.path, self.mainWindow.itemsInTree
+        )
+        children = []
+        for entry in catalog.getChildren(elem.path):
+            if self.isInTree(entry):
+                children.append(
+                    self.createTreeItem(entry, elem, entry.path in expandablePaths)
+                )
+        return children
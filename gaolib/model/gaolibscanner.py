@@ -0,0 +1,262 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+import os
+import shutil
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from gaolib.model.gaolibitem import SUMMARY_NAME, getItemType, readItemInfos
+
+DEFAULT_WORKERS = 8
+
+# Result of the scan of one directory, mtime is None if the directory vanished
+DirectoryScan = namedtuple(
+    "DirectoryScan",
+    ["relPath", "mtime", "changed", "thumbnail", "entries", "keptNames", "subFolders"],
+)
+# One new or modified folder/item found in a directory, mtime is None if incomplete
+ScannedEntry = namedtuple("ScannedEntry", ["name", "mtime", "thumbnail", "infos"])
+
+
+class GaoLibScanner(object):
+    """Scan a library ROOT with os.scandir, sub folders are listed in parallel"""
+
+    def __init__(
+        self,
+        rootPath,
+        knownMtimes={},
+        knownEntries={},
+        incompleteDirectories=set(),
+        maxWorkers=DEFAULT_WORKERS,
+        checkItems=False,
+    ):
+        self.rootPath = rootPath
+        # relative path : mtime of already scanned directories
+        self.knownMtimes = knownMtimes
+        # relative parent path : {name : (itemType, mtime)} of already read entries
+        self.knownEntries = knownEntries
+        self.incompleteDirectories = incompleteDirectories
+        self.maxWorkers = max(1, maxWorkers)
+        # directories are listed even if unchanged, and the files of their items
+        # compared, for explicit refreshes
+        self.checkItems = checkItems
+
+    def absPath(self, relPath):
+        """Return absolute path of given ROOT relative path"""
+        if not relPath:
+            return self.rootPath
+        return os.path.join(self.rootPath, *relPath.split("/"))
+
+    def scan(self, startRelPath="", recursive=True, isCancelled=None):
+        """Yield a DirectoryScan per directory, parents are always yielded first"""
+        # directories, and the entries to read in each of them, are read in parallel
+        with ThreadPoolExecutor(max_workers=self.maxWorkers) as executor:
+            # future : None for a listing, else relative path of the entry directory
+            pending = {executor.submit(self.listDirectory, startRelPath): None}
+            # relative path : [DirectoryScan, number of entries still being read]
+            reading = {}
+            while pending:
+                # directories not listed yet are dropped, running ones are awaited
+                if isCancelled is not None and isCancelled():
+                    for future in pending.keys():
+                        future.cancel()
+                    return
+                done = wait(pending.keys(), return_when=FIRST_COMPLETED)[0]
+                results = []
+                for future in done:
+                    relPath = pending.pop(future)
+                    if relPath is None:
+                        result, children = future.result()
+                        if not children:
+                            results.append(result)
+                            continue
+                        reading[result.relPath] = [result, len(children)]
+                        for dirEntry, mtime, knownMtime in children:
+                            child = executor.submit(
+                                self.readChild, dirEntry, mtime, knownMtime
+                            )
+                            pending[child] = result.relPath
+                        continue
+                    name, kept, entry = future.result()
+                    result = reading[relPath][0]
+                    if kept:
+                        result.keptNames.add(name)
+                    elif entry is not None:
+                        result.entries.append(entry)
+                    if (kept or entry is not None) and getItemType(name)[0] == "FOLDER":
+                        result.subFolders.append(self.childRelPath(relPath, name))
+                    reading[relPath][1] -= 1
+                    if reading[relPath][1] == 0:
+                        del reading[relPath]
+                        results.append(self.getReadScan(result))
+                for result in results:
+                    if recursive:
+                        for subFolder in result.subFolders:
+                            listing = executor.submit(self.listDirectory, subFolder)
+                            pending[listing] = None
+                    yield result
+
+    def listDirectory(self, relPath):
+        """List one directory if needed, return its DirectoryScan and the entries to read"""
+        absPath = self.absPath(relPath)
+        knownEntries = self.knownEntries.get(relPath, {})
+        try:
+            mtime = os.stat(absPath).st_mtime
+        except OSError:
+            return DirectoryScan(relPath, None, True, "", [], set(), []), []
+        unchanged = (
+            self.knownMtimes.get(relPath) == mtime
+            and relPath not in self.incompleteDirectories
+        )
+        if unchanged and not self.checkItems:
+            subFolders = []
+            for name in knownEntries.keys():
+                if knownEntries[name][0] == "FOLDER":
+                    subFolders.append(self.childRelPath(relPath, name))
+            return DirectoryScan(relPath, mtime, False, "", [], set(), subFolders), []
+
+        keptNames = set()
+        subFolders = []
+        # (DirEntry, mtime, known mtime compared with its files or None) to read
+        children = []
+        thumbnail = ""
+        try:
+            dirEntries = list(os.scandir(absPath))
+        except OSError as e:
+            print("Info : Could not list " + absPath + " : " + str(e))
+            dirEntries = []
+        for dirEntry in dirEntries:
+            name = dirEntry.name
+            if name in ["thumbnail_stamped.png", "thumbnail.png"]:
+                if not thumbnail or name == "thumbnail_stamped.png":
+                    thumbnail = name
+                continue
+            if name.startswith("."):
+                continue
+            try:
+                # type and stat are cached by scandir on Windows
+                if not dirEntry.is_dir():
+                    continue
+                entryMtime = dirEntry.stat().st_mtime
+            except OSError:
+                continue
+            known = knownEntries.get(name)
+            kept = known is not None and self.isEntryKept(name, known[1], entryMtime)
+            if kept:
+                keptNames.add(name)
+                if getItemType(name)[0] == "FOLDER":
+                    subFolders.append(self.childRelPath(relPath, name))
+            else:
+                knownMtime = known[1] if kept is None else None
+                children.append((dirEntry, entryMtime, knownMtime))
+        # a directory listed only to check its items is stored if one of them changed
+        result = DirectoryScan(
+            relPath, mtime, not unchanged, thumbnail, [], keptNames, subFolders
+        )
+        if not children:
+            result = self.getReadScan(result)
+        return result, children
+
+    def getReadScan(self, result):
+        """Return DirectoryScan of a listed directory once its entries are read"""
+        knownNames = set(self.knownEntries.get(result.relPath, {}).keys())
+        if not result.changed and (result.entries or result.keptNames != knownNames):
+            return result._replace(changed=True)
+        return result
+
+    def childRelPath(self, relPath, name):
+        """Return relative path of child name of given relative path"""
+        if relPath:
+            return relPath + "/" + name
+        return name
+
+    def isEntryKept(self, name, knownMtime, mtime):
+        """Return True if a folder or item entry is up to date, None if item files must be compared"""
+        if getItemType(name)[1] is None:
+            return knownMtime == mtime
+        # incomplete items are read again
+        if knownMtime is None:
+            return False
+        if self.checkItems:
+            return None
+        # item mtime includes its files, newer than the folder unless it changed
+        return mtime <= knownMtime
+
+    def getItemMtime(self, fileEntries, jsonName, mtime):
+        """Return latest mtime of an item folder and its json, summary and thumbnail files"""
+        # files rewritten in place do not change the mtime of the item folder
+        for fileEntry in fileEntries:
+            if fileEntry.name in [
+                jsonName,
+                SUMMARY_NAME,
+                "thumbnail_stamped.png",
+                "thumbnail.png",
+            ]:
+                try:
+                    mtime = max(mtime, fileEntry.stat().st_mtime)
+                except OSError:
+                    pass
+        return mtime
+
+    def readChild(self, dirEntry, mtime, knownMtime=None):
+        """Read one entry of a listed directory, return (name, kept, ScannedEntry or None)"""
+        name = dirEntry.name
+        # one listing gives thumbnails, json, summary and todelete flag
+        try:
+            fileEntries = list(os.scandir(dirEntry.path))
+        except OSError:
+            fileEntries = []
+        # items checked by an explicit refresh are kept if their files did not change
+        if (
+            knownMtime is not None
+            and self.getItemMtime(fileEntries, getItemType(name)[1], mtime)
+            == knownMtime
+        ):
+            return name, True, None
+        return name, False, self.readEntry(dirEntry.path, name, mtime, fileEntries)
+
+    def readEntry(self, absPath, name, mtime, fileEntries):
+        """Read thumbnail and infos of one folder or item from its files, return a ScannedEntry"""
+        fileNames = set([fileEntry.name for fileEntry in fileEntries])
+        # items flagged as to be deleted are cleaned at listing
+        if "todelete" in fileNames:
+            try:
+                shutil.rmtree(absPath)
+            except:
+                pass
+            return None
+        thumbnail = ""
+        for thumbnailName in ["thumbnail_stamped.png", "thumbnail.png"]:
+            if thumbnailName in fileNames:
+                thumbnail = thumbnailName
+                break
+        itemType, jsonName = getItemType(name)
+        if jsonName and jsonName not in fileNames:
+            # item is being saved (json is written last), read it again later
+            mtime = None
+        elif jsonName:
+            mtime = self.getItemMtime(fileEntries, jsonName, mtime)
+        try:
+            infos = readItemInfos(name, absPath)
+        except (OSError, ValueError) as e:
+            print("Info : Could not read infos of " + absPath + " : " + str(e))
+            infos = readItemInfos("", absPath)
+            infos["itemType"] = itemType
+        return ScannedEntry(name, mtime, thumbnail, infos)
@@ -0,0 +1,124 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+
+from gaolib.model.gaolibfuzzymatcher import GaoLibFuzzyMatcher, normalizeName
+
+
+class GaoLibTreeFilter(object):
+    """Find the tree items similar to a search text or containing similar items"""
+
+    def __init__(self):
+        self.root = None
+        # trigram index of the names of the tree under root, keys index self.elems
+        self.matcher = None
+        self.elems = None
+        # elem : its key in self.elems
+        self.keys = None
+        # keys of the items removed from the tree since the index was built
+        self.removedKeys = set()
+        self.text = None
+        # items matching, or with a matching descendant, for self.text
+        self.acceptedItems = None
+
+    def clear(self, *args):
+        """Forget last result, to be called when the tree changes (signal arguments are ignored)"""
+        self.root = None
+        self.matcher = None
+        self.elems = None
+        self.keys = None
+        self.removedKeys = set()
+        self.text = None
+        self.acceptedItems = None
+
+    def addItems(self, elems):
+        """Index given items added to the tree, with their descendants"""
+        if self.matcher is None:
+            return
+        toVisit = list(elems)
+        while toVisit:
+            elem = toVisit.pop()
+            key = self.keys.get(elem)
+            if key is None:
+                self.keys[elem] = self.matcher.addName(elem.name)
+                self.elems.append(elem)
+            else:
+                self.removedKeys.discard(key)
+            toVisit += elem.children
+        # accepted items are searched again, from the names matched before
+        self.text = None
+        self.acceptedItems = None
+
+    def removeItems(self, elems):
+        """Forget given items removed from the tree, with their descendants"""
+        if self.matcher is None:
+            return
+        toVisit = list(elems)
+        while toVisit:
+            elem = toVisit.pop()
+            key = self.keys.get(elem)
+            if key is not None:
+                self.removedKeys.add(key)
+            toVisit += elem.children
+        # index is built again once mostly made of removed items
+        if len(self.removedKeys) * 2 > len(self.elems):
+            self.matcher = None
+            self.elems = None
+            self.keys = None
+            self.removedKeys = set()
+        self.text = None
+        self.acceptedItems = None
+
+    def getAcceptedItems(self, root, text):
+        """Return set of accepted items of the tree under root for given text"""
+        text = normalizeName(text)
+        if root is not self.root:
+            self.clear()
+            self.root = root
+        if text != self.text:
+            self.acceptedItems = self.compute(root, text)
+            self.text = text
+        return self.acceptedItems
+
+    def getMatcher(self, root):
+        """Return trigram index of the names of the tree under root"""
+        if self.matcher is None:
+            self.elems = []
+            toVisit = list(root.children)
+            while toVisit:
+                elem = toVisit.pop()
+                self.elems.append(elem)
+                toVisit += elem.children
+            self.matcher = GaoLibFuzzyMatcher([elem.name for elem in self.elems])
+            self.keys = dict([(elem, key) for key, elem in enumerate(self.elems)])
+            self.removedKeys = set()
+        return self.matcher
+
+    def compute(self, root, text):
+        """Accept the matching items and all their ancestors under root"""
+        accepted = set()
+        for score, key in self.getMatcher(root).search(text):
+            if key in self.removedKeys:
+                continue
+            elem = self.elems[key]
+            # ancestors are already accepted if elem is
+            while elem is not root and elem not in accepted:
+                accepted.add(elem)
+                elem = elem.parent
+        return accepted
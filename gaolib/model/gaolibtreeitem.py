@@ -17,21 +17,41 @@
 
 __author__ = "Anne Beurard"
 
+import bisect
 import os
 
 
 class GaoLibTreeItem(object):
     """Description of one item of the Tree View"""
 
-    def __init__(self, name, parent=None, ancestors=[], path="", newName=None):
+    # a tree can hold many items, slots keep them small
+    __slots__ = (
+        "name",
+        "path",
+        "parent",
+        "ancestors",
+        "children",
+        "isItem",
+        "thumbnail",
+        "fetched",
+        "expandable",
+        "sortKey",
+        "_row",
+    )
+
+    def __init__(
+        self, name, parent=None, ancestors=[], path="", newName=None, hasThumbnail=None
+    ):
         if newName:
-            self.name = newName
+            self.setName(newName)
         else:
-            self.name = name
+            self.setName(name)
         self.path = path
         self.parent = parent
         self.ancestors = ancestors
         self.children = []
+        # position in parent children, kept up to date by addChild/removeChild
+        self._row = 0
         itemSuffixes = [
             "anim",
             "selection",
@@ -58,25 +78,55 @@ class GaoLibTreeItem(object):
                 self.thumbnail = "icons/pose2.png"
             elif suff in ["constraint"]:
                 self.thumbnail = "icons/constraint.png"
+            # items have no children to load
+            self.fetched = True
+            self.expandable = False
         else:
             thumbnailPath = os.path.join(path, "thumbnail.png")
-            if os.path.isfile(thumbnailPath):
+            # hasThumbnail can be given by the catalog to avoid a file system access
+            if hasThumbnail is None:
+                hasThumbnail = os.path.isfile(thumbnailPath)
+            if hasThumbnail:
                 self.thumbnail = thumbnailPath
             else:
                 self.thumbnail = None
+            # folder children are loaded when the folder is expanded
+            self.fetched = False
+            self.expandable = True
 
-    def parent(self):
-        """Return the parent of the item"""
-        return self.parent
+    def setName(self, name):
+        """Set item name and its sort key, children are sorted by casefolded name"""
+        self.name = name
+        self.sortKey = name.casefold()
 
     def clearChildren(self):
         """Remove all children of the item"""
         self.children = []
 
+    def getInsertRow(self, child):
+        """Return row of given child among the other children, sorted by name"""
+        sortKeys = [elem.sortKey for elem in self.children if elem is not child]
+        return bisect.bisect_right(sortKeys, child.sortKey)
+
     def addChild(self, child):
-        """Add given child to item children"""
+        """Add given child to item children, at its sorted row"""
         child.parent = self
-        self.children.append(child)
+        if not self.children or self.children[-1].sortKey <= child.sortKey:
+            # children are mostly added in order
+            row = len(self.children)
+        else:
+            row = self.getInsertRow(child)
+        self.children.insert(row, child)
+        # following children move down
+        for row in range(row, len(self.children)):
+            self.children[row]._row = row
+
+    def removeChild(self, child):
+        """Remove given child from item children"""
+        del self.children[child._row]
+        # following children move up
+        for row in range(child._row, len(self.children)):
+            self.children[row]._row = row
 
     #############################
     # methods necessary for pyqt
@@ -89,7 +139,7 @@ class GaoLibTreeItem(object):
     def row(self):
         """Return the item row"""
         if self.parent is not None:
-            return self.parent.children.index(self)
+            return self._row
 
     def child(self, row):
         """Retun the child item corresponding to given row"""
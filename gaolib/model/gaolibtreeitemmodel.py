@@ -25,10 +25,15 @@ from PySide6 import QtCore, QtGui
 class GaoLibTreeItemModel(QtCore.QAbstractItemModel):
     """Model for Tree view"""
 
-    def __init__(self, root, parent=None, projName=""):
+    def __init__(self, root, parent=None, projName="", fetchCallback=None):
         super(GaoLibTreeItemModel, self).__init__(parent)
         self._root = root
         self.__headers = ["Prod: %s" % projName]
+        # function returning the children items of a folder, called on expand
+        self.fetchCallback = fetchCallback
+        # normalized path : item, kept up to date by add/remove/modifyElement
+        self.__elemsByPath = {}
+        self.registerElement(self._root)
 
     def rowCount(self, parent):
         """Number of children for given parent"""
@@ -38,6 +43,53 @@ class GaoLibTreeItemModel(QtCore.QAbstractItemModel):
             treeItem = parent.internalPointer()
         return treeItem.childCount()
 
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        """Return True if given parent has (or may have, if not loaded) children"""
+        treeItem = self.getElement(parent)
+        if treeItem.fetched:
+            return treeItem.childCount() > 0
+        return treeItem.expandable
+
+    def canFetchMore(self, parent):
+        """Return True if children of given parent are not loaded yet"""
+        return not self.getElement(parent).fetched
+
+    def fetchMore(self, parent):
+        """Load children of given parent"""
+        treeItem = self.getElement(parent)
+        if treeItem.fetched:
+            return
+        treeItem.fetched = True
+        children = []
+        if self.fetchCallback is not None:
+            children = self.fetchCallback(treeItem)
+        if not children:
+            treeItem.expandable = False
+            return
+        # added in order, each child goes after the previous one
+        children.sort(key=lambda child: child.sortKey)
+        row = treeItem.childCount()
+        self.beginInsertRows(parent, row, row + len(children) - 1)
+        for child in children:
+            treeItem.addChild(child)
+            self.registerElement(child)
+        self.endInsertRows()
+
+    def fetchElement(self, elem):
+        """Load children of given elem if not done yet"""
+        if not elem.fetched:
+            self.fetchMore(self.getIndex(elem))
+
+    def fetchAll(self):
+        """Load the whole tree (used by search)"""
+        toFetch = [self._root]
+        while toFetch:
+            elem = toFetch.pop()
+            self.fetchElement(elem)
+            for child in elem.children:
+                if not child.isItem:
+                    toFetch.append(child)
+
     def columnCount(self, parent):
         """Number of columns"""
         return len(self.__headers)
@@ -109,85 +161,102 @@ class GaoLibTreeItemModel(QtCore.QAbstractItemModel):
 
     def getIndex(self, elem):
         """Return index of given elem"""
-        rootIdx = QtCore.QModelIndex()
-        currentIdx = rootIdx
-        rootElem = self._root
-        currentElem = elem
-
-        ancestors = [elem]
-        while currentElem.parent != rootElem:
-            ancestors.append(currentElem.parent)
-            currentElem = currentElem.parent
-        ancestors.reverse()
-
-        currentElement = rootElem
-        currentIdx = rootIdx
-        while currentElement != elem:
-            for child in currentElement.children:
-                if child in ancestors:
-                    currentElement = child
-                    currentIdx = self.index(currentElement.row(), 0, currentIdx)
-                    break
-        return currentIdx
+        if elem is self._root or elem.parent is None:
+            return QtCore.QModelIndex()
+        # items know their row, no need to walk down from the root
+        return self.createIndex(elem.row(), 0, elem)
 
     def addElement(self, elem, parent):
-        """Add elem as child of given parent"""
-        self.beginInsertRows(
-            QtCore.QModelIndex(),
-            self.rowCount(QtCore.QModelIndex()),
-            self.rowCount(QtCore.QModelIndex()),
-        )
+        """Add elem as child of given parent, at its sorted row"""
+        row = parent.getInsertRow(elem)
+        self.beginInsertRows(self.getIndex(parent), row, row)
         parent.addChild(elem)
+        self.registerElement(elem)
         self.endInsertRows()
-        self.layoutChanged.emit()
 
     def removeElement(self, elem):
         """Remove elem from parent children and remove elem index from indexes"""
         index = self.getIndex(elem)  # index of item to remove
         parentIndex = self.getIndex(elem.parent)
         self.beginRemoveRows(parentIndex, index.row(), index.row())
-        elem.parent.children.remove(elem)
+        elem.parent.removeChild(elem)
+        self.unregisterElement(elem)
         # self.indexes.remove(index)
         self.endRemoveRows()
-        self.layoutChanged.emit()
+
+    def refreshElement(self, elem):
+        """Notify views that elem display changed"""
+        index = self.getIndex(elem)
+        self.dataChanged.emit(index, index)
 
     def modifyElement(self, elem, newName, newPath):
         """Modify elem"""
         index = self.getIndex(elem)
-        # Modify elem
-        elem.name = newName
+        # Modify elem, children keys are changed by the recursive calls below
+        self.__elemsByPath.pop(self.getPathKey(elem.path), None)
+        elem.setName(newName)
         elem.path = newPath
         elem.thumbnail = os.path.join(elem.path, "thumbnail.png")
         # Modify parenthood
         newParentItem = self.getElemWithPath(os.path.dirname(newPath))
-        if elem.parent != newParentItem:
-            newParentIndex = self.getIndex(newParentItem)
-            parentIndex = self.getIndex(elem.parent)
+        if newParentItem is None or not newParentItem.fetched:
+            # new parent children are not loaded, elem is listed when they are
+            self.removeElement(elem)
+            return
+        self.__elemsByPath[self.getPathKey(newPath)] = elem
+        # Move elem to its sorted row, in its new parent or after a rename
+        row = newParentItem.getInsertRow(elem)
+        if elem.parent != newParentItem or row != index.row():
+            if elem.parent == newParentItem and row > index.row():
+                # destination row is counted with elem still in place
+                row += 1
             self.beginMoveRows(
-                parentIndex,
+                self.getIndex(elem.parent),
                 index.row(),
                 index.row(),
-                newParentIndex,
-                newParentItem.childCount(),
+                self.getIndex(newParentItem),
+                row,
             )
-            elem.parent.children.remove(elem)
-            newParentItem.children.append(elem)
-            elem.parent = newParentItem
+            elem.parent.removeChild(elem)
+            newParentItem.addChild(elem)
             elem.ancestors = newParentItem.ancestors + [newParentItem]
             self.endMoveRows()
+            index = self.getIndex(elem)
         # Modify children
         for child in elem.children:
             childPath = os.path.join(elem.path, child.name)
             self.modifyElement(child, child.name, childPath)
         self.dataChanged.emit(index, index)
 
+    def getPathKey(self, path):
+        """Return normalized path used to find items"""
+        return os.path.normcase(os.path.normpath(path))
+
+    def registerElement(self, elem):
+        """Add elem and its descendants to the path dict"""
+        toRegister = [elem]
+        while toRegister:
+            currentElem = toRegister.pop()
+            if currentElem.path:
+                self.__elemsByPath[self.getPathKey(currentElem.path)] = currentElem
+            toRegister.extend(currentElem.children)
+
+    def unregisterElement(self, elem):
+        """Remove elem and its descendants from the path dict"""
+        toUnregister = [elem]
+        while toUnregister:
+            currentElem = toUnregister.pop()
+            if currentElem.path:
+                key = self.getPathKey(currentElem.path)
+                if self.__elemsByPath.get(key) is currentElem:
+                    del self.__elemsByPath[key]
+            toUnregister.extend(currentElem.children)
+
     def getElemWithPath(self, path):
         """Return item with given path"""
-        # for index in self.indexes:
-        for index in self.getAllIndexes():
-            elem = self.getElement(index)
-            if os.path.realpath(elem.path) == os.path.realpath(path):
-                return elem
+        if not path:
+            return None
+        return self.__elemsByPath.get(self.getPathKey(path))
 
     def getAllIndexes(
         self, currentElem=None, currentIdx=QtCore.QModelIndex(), indexes=[]
@@ -0,0 +1,192 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+import os
+
+from PySide6 import QtCore
+
+from gaolib.model.catalogupdatetask import CatalogUpdateSignals, CatalogUpdateTask
+
+# Native watches are limited (inotify watches, one thread per 64 dirs on Windows)
+MAX_WATCHED_DIRECTORIES = 256
+# Delay used to gather bursts of events before refreshing (ms)
+COALESCE_DELAY = 500
+# Interval between two polls of the directories the watcher cannot follow (ms)
+POLLING_INTERVAL = 5000
+# Polls of a directory with an item still being written, each one waits twice longer
+MAX_INCOMPLETE_POLLS = 8
+
+
+class GaoLibWatcher(QtCore.QObject):
+    """Follow library directories on disk and apply their changes to the views"""
+
+    def __init__(self, mainWin, parent=None):
+        super(GaoLibWatcher, self).__init__(parent)
+        self.mainWindow = mainWin
+        self.pendingPaths = set()
+        self.polledPaths = set()
+        # directory with an incomplete item : [polls done, polls skipped before next one]
+        self.incompletePolls = {}
+        # Native watcher
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.onDirectoryChanged)
+        # Gather events before applying them
+        self.coalesceTimer = QtCore.QTimer(self)
+        self.coalesceTimer.setSingleShot(True)
+        self.coalesceTimer.setInterval(COALESCE_DELAY)
+        self.coalesceTimer.timeout.connect(self.applyChanges)
+        # directories are read in a worker, one update at a time
+        self.updatePool = QtCore.QThreadPool(self)
+        self.updatePool.setMaxThreadCount(1)
+        self.updateSignals = CatalogUpdateSignals(self)
+        self.updateSignals.finished.connect(self.onChangesScanned)
+        self.updating = False
+        # Polling fallback for network shares
+        self.pollingTimer = QtCore.QTimer(self)
+        self.pollingTimer.setInterval(POLLING_INTERVAL)
+        self.pollingTimer.timeout.connect(self.poll)
+        self.pollingTimer.start()
+
+    def isNetworkPath(self, path):
+        """Return True if path is an UNC path, native events are not reliable there"""
+        return path.startswith("\\\\") or path.startswith("//")
+
+    def getDirectoriesToWatch(self):
+        """Return displayed folder paths, current folder first then tree breadth first"""
+        paths = []
+        currentElem = self.mainWindow.currentTreeElement
+        while currentElem is not None and currentElem.path:
+            paths.append(currentElem.path)
+            currentElem = currentElem.parent
+        treeModel = getattr(self.mainWindow, "treeModel", None)
+        if treeModel is not None:
+            toVisit = [treeModel.getElement(QtCore.QModelIndex())]
+            while toVisit and len(paths) < MAX_WATCHED_DIRECTORIES:
+                elem = toVisit.pop(0)
+                for child in elem.children:
+                    if not child.isItem:
+                        toVisit.append(child)
+                        if child.path not in paths:
+                            paths.append(child.path)
+        return paths[:MAX_WATCHED_DIRECTORIES]
+
+    def updateWatchedPaths(self):
+        """Watch the displayed folders, poll the ones which cannot be watched"""
+        paths = self.getDirectoriesToWatch()
+        watched = self.watcher.directories()
+        toRemove = [path for path in watched if path not in paths]
+        if toRemove:
+            self.watcher.removePaths(toRemove)
+        toAdd = [
+            path
+            for path in paths
+            if path not in watched and not self.isNetworkPath(path)
+        ]
+        failed = []
+        if toAdd:
+            failed = self.watcher.addPaths(toAdd)
+        self.polledPaths = set(failed)
+        for path in paths:
+            if self.isNetworkPath(path):
+                self.polledPaths.add(path)
+        # the current folder is polled if it could not be watched natively
+        if self.mainWindow.currentTreeElement is not None:
+            currentPath = self.mainWindow.currentTreeElement.path
+            if currentPath and currentPath not in self.watcher.directories():
+                self.polledPaths.add(currentPath)
+
+    def onDirectoryChanged(self, path):
+        """Remember changed directory, changes are applied after a short delay"""
+        self.pendingPaths.add(path)
+        # an item may have been completed, it is polled again from the start
+        self.incompletePolls.pop(path, None)
+        if not self.coalesceTimer.isActive():
+            self.coalesceTimer.start()
+
+    def poll(self):
+        """Check polled directories and directories with items being written"""
+        self.pendingPaths.update(self.polledPaths)
+        incompletePaths = set()
+        for catalog in self.mainWindow.catalogs.values():
+            incompletePaths.update(catalog.getIncompletePaths())
+        for path in incompletePaths:
+            if self.isIncompletePollDue(path):
+                self.pendingPaths.add(path)
+        # directories which items were completed are forgotten
+        for path in list(self.incompletePolls.keys()):
+            if path not in incompletePaths:
+                del self.incompletePolls[path]
+        if self.pendingPaths and not self.coalesceTimer.isActive():
+            self.coalesceTimer.start()
+
+    def isIncompletePollDue(self, path):
+        """Return True if directory with an incomplete item has to be polled now"""
+        polls = self.incompletePolls.setdefault(path, [0, 0])
+        if polls[1] > 0:
+            polls[1] -= 1
+            return False
+        # items never completed (failed save) are not polled for the whole session
+        if polls[0] >= MAX_INCOMPLETE_POLLS:
+            return False
+        polls[0] += 1
+        polls[1] = 2 ** polls[0] - 1
+        return True
+
+    def affectsListView(self, path):
+        """Return True if changes in given directory are displayed in the list view"""
+        currentElem = self.mainWindow.currentTreeElement
+        if currentElem is None or not currentElem.path:
+            return False
+        currentPath = os.path.normcase(os.path.normpath(currentElem.path))
+        path = os.path.normcase(os.path.normpath(path))
+        if self.mainWindow.recursiveDisplayMode:
+            return path == currentPath or path.startswith(currentPath + os.sep)
+        return path == currentPath
+
+    def applyChanges(self):
+        """Scan gathered directories in a worker, changes are applied when scanned"""
+        # paths gathered meanwhile are scanned once the running update is done
+        if self.updating or not self.pendingPaths:
+            return
+        paths = list(self.pendingPaths)
+        self.pendingPaths = set()
+        self.updating = True
+        self.updatePool.start(
+            CatalogUpdateTask(
+                list(self.mainWindow.catalogs.values()),
+                self.updateSignals,
+                paths=paths,
+                recursive=False,
+            )
+        )
+
+    def onChangesScanned(self, allChanged):
+        """Apply directories modified on disk to the tree view and the list view"""
+        self.updating = False
+        if self.pendingPaths and not self.coalesceTimer.isActive():
+            self.coalesceTimer.start()
+        if not allChanged:
+            return
+        self.mainWindow.refreshEngine.syncChangedPaths(allChanged)
+        for changedPath in allChanged:
+            if self.affectsListView(changedPath):
+                self.mainWindow.refreshListView()
+                break
+        # new folders may have to be watched
+        self.updateWatchedPaths()
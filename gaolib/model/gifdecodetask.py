@@ -0,0 +1,87 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+import threading
+from collections import deque
+
+from PySide6 import QtCore, QtGui
+
+# Frames decoded ahead of the displayed one
+RING_SIZE = 8
+
+
+class GifDecodeTask(QtCore.QRunnable):
+    """Decode one loop of a gif scaled to a cell, out of the GUI thread, a few frames ahead"""
+
+    def __init__(self, path, size, ratio=1.0):
+        super(GifDecodeTask, self).__init__()
+        self.path = path
+        self.size = size
+        self.ratio = ratio
+        # ring buffer of (QImage, delay in ms) decoded and not taken yet
+        self.frames = deque()
+        self.condition = threading.Condition()
+        self.cancelled = False
+        self.finished = False
+
+    def run(self):
+        try:
+            reader = QtGui.QImageReader(self.path)
+            while True:
+                image = reader.read()
+                if image.isNull():
+                    break
+                delay = reader.nextImageDelay()
+                image = image.scaled(
+                    self.size * self.ratio,
+                    QtCore.Qt.KeepAspectRatio,
+                    QtCore.Qt.SmoothTransformation,
+                )
+                with self.condition:
+                    # wait for the player when the buffer is full
+                    while len(self.frames) >= RING_SIZE and not self.cancelled:
+                        self.condition.wait()
+                    if self.cancelled:
+                        return
+                    self.frames.append((image, delay))
+        except Exception as e:
+            print("Info : Could not decode " + self.path + " : " + str(e))
+        finally:
+            with self.condition:
+                self.finished = True
+
+    def take(self):
+        """Return next decoded (QImage, delay), None if not decoded yet"""
+        with self.condition:
+            if not self.frames:
+                return None
+            frame = self.frames.popleft()
+            self.condition.notify()
+            return frame
+
+    def isDone(self):
+        """Return True when every decoded frame was taken"""
+        with self.condition:
+            return self.finished and not self.frames
+
+    def cancel(self):
+        """Stop decoding, the worker thread is released at once"""
+        with self.condition:
+            self.cancelled = True
+            self.condition.notify()
@@ -0,0 +1,82 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+import os
+from collections import OrderedDict
+
+# Memory budget of the decoded gif frames
+GIF_CACHE_MB = 64
+
+
+class GifFrameCache(object):
+    """Gif frames decoded and scaled to a list cell, least recently played gifs are dropped first"""
+
+    _instance = None
+
+    def __init__(self, maxBytes=GIF_CACHE_MB * 1024 * 1024):
+        # (path, mtime, width, height, ratio) : list of (QPixmap, delay in ms)
+        self.cache = OrderedDict()
+        self.maxBytes = maxBytes
+        self.currentBytes = 0
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def getModifiedTime(self, path):
+        """Return modification time of the gif at path, None if missing"""
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def getKey(self, path, mtime, size, ratio):
+        """Return cache key of the gif at path, modified at mtime, played in size (QSize)"""
+        # a modified gif gets a new key, its old frames are dropped with time
+        return (os.path.normcase(path), mtime, size.width(), size.height(), ratio)
+
+    def getFramesBytes(self, frames):
+        """Return memory used by given frames"""
+        return sum(
+            [
+                pixmap.width() * pixmap.height() * pixmap.depth() // 8
+                for pixmap, delay in frames
+            ]
+        )
+
+    def find(self, key):
+        """Return frames of given key, None if not cached"""
+        frames = self.cache.get(key)
+        if frames is not None:
+            self.cache.move_to_end(key)
+        return frames
+
+    def insert(self, key, frames):
+        """Cache frames of given key, gifs bigger than the whole budget are not kept"""
+        size = self.getFramesBytes(frames)
+        if size > self.maxBytes:
+            return
+        if key in self.cache.keys():
+            self.currentBytes -= self.getFramesBytes(self.cache.pop(key))
+        self.cache[key] = frames
+        self.currentBytes += size
+        while self.currentBytes > self.maxBytes:
+            self.currentBytes -= self.getFramesBytes(self.cache.popitem(last=False)[1])
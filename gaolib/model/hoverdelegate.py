@@ -1,13 +1,24 @@
 from PySide6 import QtWidgets, QtGui, QtCore
 import gaolib.model.thumbnailcache as thc
+from gaolib.model.gifframecache import GifFrameCache
+from gaolib.model.hoverpreviewplayer import HoverPreviewPlayer
 
 
 class HoverDelegate(QtWidgets.QStyledItemDelegate):
     def __init__(self, view, parent=None):
         super().__init__(parent)
         self.view = view
-        self.movie = None
+        # plays the gif of the hovered animation, frames are kept for next hovers
+        self.player = HoverPreviewPlayer(self)
+        self.player.frameChanged.connect(self.on_frame_changed)
         self.hover_index = QtCore.QPersistentModelIndex()
+        # (gif path, mtime) of the hovered animation, None for other items
+        self.hover_gif = None
+        # thumbpath : persistent indexes of the painted rows waiting for it
+        self.waitingIndexes = {}
+        cache = thc.ThumbnailCache.instance()
+        cache.thumbnailsLoaded.connect(self.onThumbnailsLoaded)
+        cache.thumbnailsDropped.connect(self.onThumbnailsDropped)
 
     def paint(self, painter, option, index):
         painter.save()
@@ -47,29 +58,31 @@ class HoverDelegate(QtWidgets.QStyledItemDelegate):
             textHeight,
         )
 
+        scaled = None
         # if animation, play the gif
-        if (
-            index == self.hover_index
-            and self.movie
-            and item.itemType in ["ANIMATION", "MULTI ANIMATION"]
-        ):
-            pixmap = self.movie.currentPixmap()
-        else:
+        if index == self.hover_index and self.hover_gif is not None:
+            path, mtime = self.hover_gif
+            # frames are scaled to the cell by the player
+            self.player.start(
+                path, mtime, imageRect.size(), self.view.devicePixelRatioF()
+            )
+            scaled = self.player.currentPixmap()
+        # thumbnail is displayed until the first frame is decoded
+        if not scaled:
             # Get the thumbnail cache instance
             cache = thc.ThumbnailCache.instance()
-            # lazy loading of the thumbnail
-            pixmap = cache.request(item.thumbpath)
-        if not pixmap:
-            pixmap = QtGui.QPixmap()
-        else:
-            scaled = pixmap.scaled(
-                imageRect.size(),
-                QtCore.Qt.KeepAspectRatio,
-                QtCore.Qt.SmoothTransformation,
+            # lazy loading of the thumbnail, scaled pixmaps are cached too
+            scaled = cache.requestScaled(
+                item.thumbpath, imageRect.size(), self.view.devicePixelRatioF()
             )
+            # failed thumbnails are not loaded again before a while, rows do not wait
+            if not scaled and cache.isLoading(item.thumbpath):
+                self.waitForThumbnail(item.thumbpath, index)
+        if scaled:
+            size = scaled.deviceIndependentSize()
             # center image
-            x = imageRect.x() + (imageRect.width() - scaled.width()) // 2
-            y = imageRect.y() + (imageRect.height() - scaled.height()) // 2
+            x = imageRect.x() + (imageRect.width() - int(size.width())) // 2
+            y = imageRect.y() + (imageRect.height() - int(size.height())) // 2
 
             painter.drawPixmap(x, y, scaled)
         text = index.data(QtCore.Qt.DisplayRole)
@@ -86,6 +99,29 @@ class HoverDelegate(QtWidgets.QStyledItemDelegate):
         painter.drawText(textRect, QtCore.Qt.AlignCenter, text)
         painter.restore()
 
+    def waitForThumbnail(self, thumbpath, index):
+        """Repaint index when the thumbnail at thumbpath is loaded"""
+        indexes = self.waitingIndexes.setdefault(thumbpath, [])
+        # several rows can share one thumbnail
+        if index not in indexes:
+            indexes.append(QtCore.QPersistentModelIndex(index))
+
+    def onThumbnailsLoaded(self, thumbpaths):
+        """Repaint at once the rows waiting for the loaded thumbnails"""
+        region = QtGui.QRegion()
+        for thumbpath in thumbpaths:
+            for index in self.waitingIndexes.pop(thumbpath, []):
+                # rows removed since (or hidden by the filter) are skipped
+                if index.isValid():
+                    region = region.united(self.view.visualRect(index))
+        if not region.isEmpty():
+            self.view.viewport().update(region)
+
+    def onThumbnailsDropped(self, thumbpaths):
+        """Forget rows waiting for thumbnails which are not loaded, they ask again when painted"""
+        for thumbpath in thumbpaths:
+            self.waitingIndexes.pop(thumbpath, None)
+
     def updateIndex(self, index):
         if index.isValid():
             rect = self.view.visualRect(index)
@@ -97,29 +133,32 @@ class HoverDelegate(QtWidgets.QStyledItemDelegate):
 
         self.stopMovie()
         self.hover_index = QtCore.QPersistentModelIndex(index)
-        item = index.data(QtCore.Qt.UserRole)
+        self.hover_gif = None
+        item = index.data(QtCore.Qt.UserRole) if index.isValid() else None
+        if item is not None and item.itemType in ["ANIMATION", "MULTI ANIMATION"]:
+            # the gif file is looked up once per hover, paints only compare its key
+            path = self.getGifPath(item)
+            self.hover_gif = (path, GifFrameCache.instance().getModifiedTime(path))
+        # gif is played when the row is painted, at its cell size
+        self.updateIndex(index)
+
+    def getGifPath(self, item):
+        """Return path of the gif of given animation item"""
         stamped = item.stamped
         if stamped:
-            stamped = item.stamped.replace("png", "gif").replace("_stamped", "")
-        gif_path = stamped
-        self.movie = QtGui.QMovie(gif_path)
-        self.movie.setCacheMode(QtGui.QMovie.CacheAll)
-        self.movie.frameChanged.connect(self.on_frame_changed)
-        self.movie.start()
-        self.updateIndex(index)
+            return item.stamped.replace("png", "gif").replace("_stamped", "")
+        return ""
 
     def clear_hover_index(self):
         self.stopMovie()
         oldIdx = self.hover_index
         self.hover_index = QtCore.QPersistentModelIndex()
+        self.hover_gif = None
         if oldIdx.isValid():
             self.updateIndex(oldIdx)
 
     def stopMovie(self):
-        if self.movie:
-            self.movie.stop()
-            self.movie.deleteLater()
-            self.movie = None
+        self.player.stop()
 
     def on_frame_changed(self):
         if self.hover_index.isValid():
@@ -0,0 +1,125 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+from PySide6 import QtCore, QtGui
+
+from gaolib.model.gifdecodetask import GifDecodeTask
+from gaolib.model.gifframecache import GifFrameCache
+
+# Shortest delay between two frames (ms), gifs often ask for 0
+MIN_FRAME_DELAY = 20
+# Threads decoding gifs, a cancelled decode may still be finishing its frame
+DECODE_THREADS = 2
+
+
+class HoverPreviewPlayer(QtCore.QObject):
+    """Play the gif of the hovered item with frames scaled to its cell, from GifFrameCache once played"""
+
+    frameChanged = QtCore.Signal()
+
+    def __init__(self, parent=None):
+        super(HoverPreviewPlayer, self).__init__(parent)
+        self.key = None
+        # list of (QPixmap, delay in ms), recorded during the first playback
+        self.frames = []
+        self.frameIndex = 0
+        # GifDecodeTask of the first playback
+        self.task = None
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(DECODE_THREADS)
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.nextFrame)
+
+    def start(self, path, mtime, size, ratio=1.0):
+        """Play gif at path modified at mtime, scaled to size (QSize), nothing is done if already played"""
+        # mtime is looked up once by the caller, None if the gif is missing
+        if mtime is None:
+            self.stop()
+            return
+        key = GifFrameCache.instance().getKey(path, mtime, size, ratio)
+        if key == self.key:
+            return
+        self.stop()
+        self.key = key
+        frames = GifFrameCache.instance().find(key)
+        if frames:
+            self.frames = frames
+            self.showFrame(0)
+            return
+        # first playback is decoded in a worker, its frames are recorded for next times
+        self.task = GifDecodeTask(path, size, ratio)
+        # taken from after its run ends
+        self.task.setAutoDelete(False)
+        self.pool.start(self.task)
+        self.timer.start(MIN_FRAME_DELAY)
+
+    def takeFrame(self):
+        """Display next frame decoded by the worker, frames are cached after one loop"""
+        frame = self.task.take()
+        if frame is None:
+            if self.task.isDone():
+                self.storeFrames()
+            else:
+                # worker is late, current frame stays displayed
+                self.timer.start(MIN_FRAME_DELAY)
+            return
+        image, delay = frame
+        pixmap = QtGui.QPixmap.fromImage(image)
+        pixmap.setDevicePixelRatio(self.task.ratio)
+        self.frames.append((pixmap, max(delay, MIN_FRAME_DELAY)))
+        self.showFrame(len(self.frames) - 1)
+
+    def storeFrames(self):
+        """Cache recorded frames, then play them without the worker"""
+        self.task = None
+        if not self.frames:
+            return
+        GifFrameCache.instance().insert(self.key, self.frames)
+        self.showFrame(0)
+
+    def showFrame(self, frameIndex):
+        """Display given frame until its delay is over"""
+        self.frameIndex = frameIndex
+        # a still image is not repainted again
+        if self.task is not None or len(self.frames) > 1:
+            self.timer.start(self.frames[frameIndex][1])
+        self.frameChanged.emit()
+
+    def nextFrame(self):
+        if self.task is not None:
+            self.takeFrame()
+        else:
+            self.showFrame((self.frameIndex + 1) % len(self.frames))
+
+    def currentPixmap(self):
+        """Return displayed frame, None before the first one is decoded"""
+        if not self.frames:
+            return None
+        return self.frames[self.frameIndex][0]
+
+    def stop(self):
+        """Stop playback, nothing runs until next start"""
+        self.timer.stop()
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.key = None
+        self.frames = []
+        self.frameIndex = 0
@@ -0,0 +1,131 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+import os
+
+from PySide6 import QtCore
+
+from gaolib.model.gaolibitem import GaoLibItemRecord, getSortKey
+
+# Number of rows sent to the list view at once
+CHUNK_SIZE = 200
+
+FOLDER_ICON = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), "../icons/folder2.png")
+)
+
+
+class ListingSignals(QtCore.QObject):
+    """Signals of the listing tasks, received in the GUI thread (queued)"""
+
+    # generation, list of GaoLibItemRecord
+    chunkReady = QtCore.Signal(int, object)
+    # generation, list of directories modified on disk
+    finished = QtCore.Signal(int, object)
+
+
+class ListingTask(QtCore.QRunnable):
+    """List one folder content (or its sub tree) from the catalog, out of the GUI thread"""
+
+    def __init__(
+        self,
+        generation,
+        catalog,
+        folderPath,
+        recursive,
+        signals,
+        isCurrent,
+        sortMode="name",
+        checkItems=False,
+    ):
+        super(ListingTask, self).__init__()
+        self.generation = generation
+        self.catalog = catalog
+        self.folderPath = folderPath
+        self.recursive = recursive
+        self.signals = signals
+        # function returning False when another listing was started
+        self.isCurrent = isCurrent
+        self.sortMode = sortMode
+        # items changed in place are looked for too, for explicit refreshes
+        self.checkItems = checkItems
+
+    def run(self):
+        """Update catalog from disk, then send the folder content by chunks"""
+        changed = []
+        try:
+            changed = self.updateCatalogs()
+            if not self.isCurrent():
+                return
+            records = [self.getRecord(entry) for entry in self.getEntries()]
+            # rows sorted as in the view, batches of displayed rows are contiguous
+            records.sort(key=lambda record: getSortKey(record, self.sortMode))
+            for start in range(0, len(records), CHUNK_SIZE):
+                if not self.isCurrent():
+                    return
+                self.signals.chunkReady.emit(
+                    self.generation, records[start : start + CHUNK_SIZE]
+                )
+        except Exception as e:
+            print("Info : Could not list " + self.getDescription() + " : " + str(e))
+        finally:
+            # directories changes are applied to the tree even if cancelled
+            self.signals.finished.emit(self.generation, changed)
+
+    def updateCatalogs(self):
+        """Update catalog from disk, return paths of the modified directories"""
+        # Only rescan directories modified since last listing
+        return self.catalog.update(
+            self.folderPath,
+            recursive=self.recursive,
+            isCancelled=self.isCancelled,
+            checkItems=self.checkItems,
+        )
+
+    def isCancelled(self):
+        """Return True when another listing was started, the scan stops then"""
+        return not self.isCurrent()
+
+    def getEntries(self):
+        """Return CatalogRecords to list"""
+        if self.recursive:
+            return self.catalog.getDescendantItems(self.folderPath, light=True)
+        return self.catalog.getChildren(self.folderPath, light=True)
+
+    def getDescription(self):
+        """Return what is listed, for error messages"""
+        return self.folderPath
+
+    def getRecord(self, entry):
+        """Return GaoLibItemRecord of given catalog record"""
+        if entry.thumbnail:
+            thumbpath = os.path.join(entry.path, entry.thumbnail).replace("\\", "/")
+        elif entry.itemType == "FOLDER":
+            thumbpath = FOLDER_ICON
+        else:
+            thumbpath = "icons/nopreview2.png"
+        return GaoLibItemRecord(
+            name=entry.name,
+            thumbpath=thumbpath,
+            path=entry.path,
+            itemType=entry.itemType,
+            mtime=entry.mtime,
+            owner=entry.owner,
+            date=entry.date,
+        )
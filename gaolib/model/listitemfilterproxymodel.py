@@ -0,0 +1,232 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+import re
+from operator import itemgetter
+
+from PySide6 import QtCore
+
+from gaolib.model.gaolibfuzzymatcher import normalizeName
+
+# Time without typing before the list is filtered (ms)
+SEARCH_DELAY = 150
+# Characters making the search text a regular expression
+REGEX_CHARACTERS = set(".*+?[](){}|^$\\")
+
+
+def getRegularExpression(text):
+    """Return compiled case insensitive regular expression of text, None for plain text"""
+    if not REGEX_CHARACTERS.intersection(text):
+        return None
+    try:
+        return re.compile(text, re.IGNORECASE)
+    except re.error:
+        # incomplete expression while typing, searched as plain text
+        return None
+
+
+class ListItemFilterProxyModel(QtCore.QAbstractProxyModel):
+    """Filter model for list items, rows similar to search text come best first"""
+
+    def __init__(self, parent=None):
+        super(ListItemFilterProxyModel, self).__init__(parent)
+        self.text = ""
+        # regular expression matched against the names, None for plain text search
+        self.regex = None
+        # displayed source rows, best matches first, None when nothing is filtered
+        self.proxyRows = None
+        # source row : displayed row of the matching rows
+        self.sourceRows = {}
+        # (persistent index, its source index) kept during a layout change
+        self.layoutIndexes = []
+
+    def setSourceModel(self, sourceModel):
+        """Set source model, displayed rows follow its changes"""
+        self.beginResetModel()
+        super(ListItemFilterProxyModel, self).setSourceModel(sourceModel)
+        sourceModel.rowsAboutToBeInserted.connect(self.onRowsAboutToBeInserted)
+        sourceModel.rowsInserted.connect(self.onRowsInserted)
+        sourceModel.rowsAboutToBeRemoved.connect(self.onRowsAboutToBeRemoved)
+        sourceModel.rowsRemoved.connect(self.onRowsRemoved)
+        sourceModel.dataChanged.connect(self.onDataChanged)
+        sourceModel.layoutAboutToBeChanged.connect(self.beginLayoutChange)
+        sourceModel.layoutChanged.connect(self.endLayoutChange)
+        sourceModel.modelAboutToBeReset.connect(self.beginResetModel)
+        sourceModel.modelReset.connect(self.onModelReset)
+        self.matchRows()
+        self.endResetModel()
+
+    def setFilterText(self, text):
+        """Filter list with given text, a regular expression if it uses regex syntax"""
+        regex = getRegularExpression(text)
+        if regex is None:
+            text = normalizeName(text)
+        if text == self.text:
+            return
+        self.beginLayoutChange()
+        self.text = text
+        self.regex = regex
+        self.endLayoutChange()
+
+    def matchRows(self):
+        """Compute displayed rows, ranked once without comparing rows in Python"""
+        if not self.text or self.sourceModel() is None:
+            self.proxyRows = None
+            self.sourceRows = {}
+            return
+        sourceModel = self.sourceModel()
+        if self.regex is not None:
+            # rows keep the source order
+            names = sourceModel.getLowerNames()
+            self.proxyRows = [
+                row for row in range(len(names)) if self.regex.search(names[row])
+            ]
+        else:
+            # sorted by row, then by score, the sort is stable so equal scores keep
+            # the source order
+            scoredRows = sorted(
+                sourceModel.getMatcher().search(self.text), key=itemgetter(1)
+            )
+            scoredRows.sort(key=itemgetter(0), reverse=True)
+            self.proxyRows = [row for score, row in scoredRows]
+        self.sourceRows = dict(
+            [(sourceRow, row) for row, sourceRow in enumerate(self.proxyRows)]
+        )
+
+    def beginLayoutChange(self, *args):
+        """Remember source rows of the persistent indexes (signal arguments are ignored)"""
+        self.layoutAboutToBeChanged.emit()
+        self.layoutIndexes = [
+            (index, QtCore.QPersistentModelIndex(self.mapToSource(index)))
+            for index in self.persistentIndexList()
+        ]
+
+    def endLayoutChange(self, *args):
+        """Match rows again, selection and current row follow their source rows"""
+        self.matchRows()
+        for index, sourceIndex in self.layoutIndexes:
+            self.changePersistentIndex(
+                index,
+                self.mapFromSource(QtCore.QModelIndex(sourceIndex)),
+            )
+        self.layoutIndexes = []
+        self.layoutChanged.emit()
+
+    def onRowsAboutToBeInserted(self, parent, first, last):
+        """Insert rows as they are when nothing is filtered"""
+        if self.proxyRows is None:
+            self.beginInsertRows(QtCore.QModelIndex(), first, last)
+        elif first != self.sourceModel().rowCount():
+            # other rows move, all rows are matched again
+            self.beginLayoutChange()
+
+    def onRowsInserted(self, parent, first, last):
+        """Match inserted rows, appended rows only when possible"""
+        if self.proxyRows is None:
+            self.endInsertRows()
+        elif last != self.sourceModel().rowCount() - 1:
+            self.endLayoutChange()
+        elif self.regex is not None:
+            # appended rows only are matched, they come after the others
+            names = self.sourceModel().getLowerNames()
+            rows = [
+                row for row in range(first, last + 1) if self.regex.search(names[row])
+            ]
+            if rows:
+                count = len(self.proxyRows)
+                self.beginInsertRows(QtCore.QModelIndex(), count, count + len(rows) - 1)
+                for row in rows:
+                    self.sourceRows[row] = len(self.proxyRows)
+                    self.proxyRows.append(row)
+                self.endInsertRows()
+        else:
+            # appended rows may rank anywhere, the matcher only tests the names
+            # matched before and the appended ones
+            self.beginLayoutChange()
+            self.endLayoutChange()
+
+    def onRowsAboutToBeRemoved(self, parent, first, last):
+        """Remove rows as they are when nothing is filtered"""
+        if self.proxyRows is None:
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+        else:
+            self.beginLayoutChange()
+
+    def onRowsRemoved(self, parent, first, last):
+        """Match remaining rows again when filtered, their source rows moved"""
+        if self.proxyRows is None:
+            self.endRemoveRows()
+        else:
+            self.endLayoutChange()
+
+    def onDataChanged(self, topLeft, bottomRight, roles=[]):
+        """Forward changed rows which are displayed"""
+        for sourceRow in range(topLeft.row(), bottomRight.row() + 1):
+            index = self.mapFromSource(
+                self.sourceModel().index(sourceRow, 0, QtCore.QModelIndex())
+            )
+            if index.isValid():
+                self.dataChanged.emit(index, index, roles)
+
+    def onModelReset(self, *args):
+        """Match rows of the new content (signal arguments are ignored)"""
+        self.matchRows()
+        self.endResetModel()
+
+    def mapToSource(self, proxyIndex):
+        """Return source index of given displayed index"""
+        if not proxyIndex.isValid():
+            return QtCore.QModelIndex()
+        row = proxyIndex.row()
+        if self.proxyRows is not None:
+            row = self.proxyRows[row]
+        return self.sourceModel().index(row, proxyIndex.column(), QtCore.QModelIndex())
+
+    def mapFromSource(self, sourceIndex):
+        """Return displayed index of given source index, invalid if filtered out"""
+        if not sourceIndex.isValid():
+            return QtCore.QModelIndex()
+        row = sourceIndex.row()
+        if self.proxyRows is not None:
+            row = self.sourceRows.get(row)
+            if row is None:
+                return QtCore.QModelIndex()
+        return self.createIndex(row, sourceIndex.column())
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        """Number of displayed rows"""
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        if self.proxyRows is None:
+            return self.sourceModel().rowCount()
+        return len(self.proxyRows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        """List is a table of dimension one"""
+        return 1
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        """Return index of given displayed row"""
+        if parent.isValid() or not 0 <= row < self.rowCount():
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index):
+        """List items have no parent"""
+        return QtCore.QModelIndex()
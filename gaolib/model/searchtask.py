@@ -0,0 +1,52 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+from gaolib.model.listingtask import ListingTask
+
+
+class SearchTask(ListingTask):
+    """List the items of all libraries matching a search query, out of the GUI thread"""
+
+    def __init__(
+        self, generation, catalogs, query, signals, isCurrent, sortMode="name"
+    ):
+        super(SearchTask, self).__init__(
+            generation, None, None, True, signals, isCurrent, sortMode=sortMode
+        )
+        self.catalogs = catalogs
+        self.query = query
+
+    def updateCatalogs(self):
+        """Scan the libraries not entirely scanned yet, return modified directories"""
+        changed = []
+        for catalog in self.catalogs:
+            if not catalog.fullyScanned and self.isCurrent():
+                changed += catalog.update(isCancelled=self.isCancelled)
+        return changed
+
+    def getEntries(self):
+        """Return CatalogRecords of the items matching the query in all libraries"""
+        entries = []
+        for catalog in self.catalogs:
+            entries += catalog.search(self.query, light=True)
+        return entries
+
+    def getDescription(self):
+        """Return what is listed, for error messages"""
+        return "search results of " + self.query
@@ -0,0 +1,359 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+from PySide6 import QtCore, QtGui
+
+from gaolib.model.thumbnaildiskcache import ThumbnailDiskCache
+from gaolib.model.thumbnailtask import THUMBNAIL_SIZE
+
+ATLAS_VERSION = 2
+# Thumbnails per atlas page (one image file), in rows of ATLAS_COLUMNS
+ATLAS_PAGE_SIZE = 64
+ATLAS_COLUMNS = 8
+THUMBNAIL_NAMES = ["thumbnail.png", "thumbnail_stamped.png"]
+# Decoded pages kept for the next thumbnails read, about 10 MB each
+MAX_DECODED_PAGES = 2
+
+# page path : QImage, last used last, page files are never rewritten
+_decodedPages = OrderedDict()
+_decodedLock = threading.Lock()
+
+
+def getAtlasFolder(thumbpath):
+    """Return folder which atlas holds given item thumbnail, None if not an item thumbnail"""
+    if (
+        not os.path.isabs(thumbpath)
+        or os.path.basename(thumbpath) not in THUMBNAIL_NAMES
+    ):
+        return None
+    # folder/item.pose/thumbnail.png
+    return os.path.dirname(os.path.dirname(thumbpath))
+
+
+class ThumbnailAtlas(object):
+    """Thumbnails of the items of one folder, packed in a few page images with their offset table"""
+
+    def __init__(self, folderPath, findCatalog=None):
+        self.folderPath = folderPath
+        # function returning the catalog of a path, or None
+        self.findCatalog = findCatalog
+        # atlas files without extension, found by the first read or update
+        self.basePath = None
+        # thumbpath : [slot, width, height, mtime, size], None until the table is read
+        self.entries = None
+        # page : file name of its image, files are never rewritten: an update saves
+        # new ones then replaces the table, so a table always matches the pages it names
+        self.pages = {}
+        # item name : mtime in the catalog, which includes its thumbnail files,
+        # queried once per read or update instead of a stat per thumbnail
+        self.itemMtimes = None
+        # reads and updates of a session share the atlas of a folder, other sessions
+        # may write its files meanwhile
+        self.lock = threading.Lock()
+
+    def findBasePath(self):
+        """Set path of the atlas files, in the cache folder of the folder ROOT"""
+        cacheFolder = ThumbnailDiskCache.instance().getCacheFolder(
+            os.path.join(self.folderPath, "atlas")
+        )
+        key = "%s|%d" % (
+            os.path.normcase(os.path.realpath(self.folderPath)),
+            THUMBNAIL_SIZE,
+        )
+        self.basePath = os.path.join(
+            cacheFolder, "atlas", hashlib.md5(key.encode("utf-8")).hexdigest()
+        )
+
+    def readTable(self):
+        """Read entries and pages of the offset table, empty if missing or from another version"""
+        self.entries = {}
+        self.pages = {}
+        try:
+            with open(self.basePath + ".json") as file:
+                table = json.load(file)
+        except (OSError, ValueError):
+            return
+        if table.get("version") != ATLAS_VERSION:
+            return
+        self.entries = table["entries"]
+        self.pages = {int(page): fileName for page, fileName in table["pages"].items()}
+
+    def writeTable(self):
+        """Write the offset table, aside then renamed"""
+        tempPath = "%s.json.%d.%d.tmp" % (
+            self.basePath,
+            os.getpid(),
+            threading.get_ident(),
+        )
+        with open(tempPath, "w") as file:
+            json.dump(
+                {
+                    "version": ATLAS_VERSION,
+                    "entries": self.entries,
+                    "pages": self.pages,
+                },
+                file,
+            )
+        os.replace(tempPath, self.basePath + ".json")
+
+    def readItemMtimes(self):
+        """Read mtimes of the items of the folder from its catalog, empty without one"""
+        catalog = self.findCatalog(self.folderPath) if self.findCatalog else None
+        if catalog is None:
+            self.itemMtimes = {}
+        else:
+            self.itemMtimes = catalog.getItemMtimes(self.folderPath)
+
+    def getSignature(self, thumbpath):
+        """Return [item mtime] from the catalog, else [mtime, size] of the file, None if missing"""
+        itemMtime = self.itemMtimes.get(os.path.basename(os.path.dirname(thumbpath)))
+        if itemMtime is not None:
+            return [itemMtime]
+        # folders and items not scanned yet
+        try:
+            stat = os.stat(thumbpath)
+        except OSError:
+            return None
+        return [stat.st_mtime, stat.st_size]
+
+    def getPagePath(self, page):
+        """Return image path of given page, None if it has none"""
+        if page not in self.pages:
+            return None
+        return os.path.join(os.path.dirname(self.basePath), self.pages[page])
+
+    def getCellRect(self, slot, width=THUMBNAIL_SIZE, height=THUMBNAIL_SIZE):
+        """Return rect of given slot in its page"""
+        cell = slot % ATLAS_PAGE_SIZE
+        return QtCore.QRect(
+            (cell % ATLAS_COLUMNS) * THUMBNAIL_SIZE,
+            (cell // ATLAS_COLUMNS) * THUMBNAIL_SIZE,
+            width,
+            height,
+        )
+
+    def getPageImage(self, page):
+        """Return decoded image of given page, None if missing"""
+        pagePath = self.getPagePath(page)
+        if pagePath is None:
+            return None
+        with _decodedLock:
+            pageImage = _decodedPages.get(pagePath)
+            if pageImage is not None:
+                _decodedPages.move_to_end(pagePath)
+                return pageImage
+        pageImage = QtGui.QImage(pagePath)
+        if pageImage.isNull():
+            return None
+        with _decodedLock:
+            _decodedPages[pagePath] = pageImage
+            while len(_decodedPages) > MAX_DECODED_PAGES:
+                _decodedPages.popitem(last=False)
+        return pageImage
+
+    def load(self, thumbpath):
+        """Return QImage of given thumbnail, None if missing or outdated in the atlas"""
+        with self.lock:
+            if self.entries is None:
+                self.findBasePath()
+                self.readTable()
+            if self.itemMtimes is None:
+                self.readItemMtimes()
+            entry = self.entries.get(thumbpath)
+            # modified thumbnails are loaded one by one, then updated in the atlas
+            if entry is None or self.getSignature(thumbpath) != entry[3:]:
+                return None
+            pageImage = self.getPageImage(entry[0] // ATLAS_PAGE_SIZE)
+            if pageImage is None:
+                return None
+            return pageImage.copy(self.getCellRect(*entry[:3]))
+
+    def update(self, images):
+        """Store given thumbnails (thumbpath : QImage), only pages holding them are rewritten"""
+        with self.lock:
+            if self.basePath is None:
+                self.findBasePath()
+            # table may have been written by another session
+            self.readTable()
+            self.readItemMtimes()
+            # thumbnails which page file was pruned are added again when loaded one by one
+            missingPages = [
+                page
+                for page in self.pages.keys()
+                if not os.path.isfile(self.getPagePath(page))
+            ]
+            for page in missingPages:
+                del self.pages[page]
+            # slots of vanished thumbnails are reused
+            freeSlots = []
+            for thumbpath, entry in list(self.entries.items()):
+                if entry[0] // ATLAS_PAGE_SIZE not in self.pages or not os.path.exists(
+                    thumbpath
+                ):
+                    freeSlots.append(self.entries.pop(thumbpath)[0])
+            usedSlots = [entry[0] for entry in self.entries.values()]
+            nextSlot = max(usedSlots + freeSlots + [-1]) + 1
+            freeSlots.sort(reverse=True)
+            changedPages = {}
+            for thumbpath, image in images.items():
+                signature = self.getSignature(thumbpath)
+                if signature is None or image.isNull():
+                    continue
+                if thumbpath in self.entries.keys():
+                    slot = self.entries[thumbpath][0]
+                elif freeSlots:
+                    slot = freeSlots.pop()
+                else:
+                    slot = nextSlot
+                    nextSlot += 1
+                self.entries[thumbpath] = [
+                    slot,
+                    image.width(),
+                    image.height(),
+                ] + signature
+                changedPages.setdefault(slot // ATLAS_PAGE_SIZE, []).append(
+                    (slot, image)
+                )
+            if not os.path.isdir(os.path.dirname(self.basePath)):
+                os.makedirs(os.path.dirname(self.basePath), exist_ok=True)
+            replacedPaths = []
+            for page, cells in changedPages.items():
+                if page in self.pages:
+                    replacedPaths.append(self.getPagePath(page))
+                self.writePage(page, cells)
+            self.writeTable()
+            # sessions still reading the previous table load these thumbnails one by one
+            for pagePath in replacedPaths:
+                try:
+                    os.remove(pagePath)
+                except OSError:
+                    pass
+
+    def writePage(self, page, cells):
+        """Draw given (slot, QImage) cells in a new file of their page"""
+        pageImage = self.getPageImage(page)
+        rows = ATLAS_PAGE_SIZE // ATLAS_COLUMNS
+        if pageImage is None:
+            pageImage = QtGui.QImage(
+                ATLAS_COLUMNS * THUMBNAIL_SIZE,
+                rows * THUMBNAIL_SIZE,
+                QtGui.QImage.Format_ARGB32_Premultiplied,
+            )
+            pageImage.fill(QtCore.Qt.transparent)
+        else:
+            pageImage = pageImage.convertToFormat(
+                QtGui.QImage.Format_ARGB32_Premultiplied
+            )
+        painter = QtGui.QPainter(pageImage)
+        painter.setCompositionMode(QtGui.QPainter.CompositionMode_Source)
+        for slot, image in cells:
+            painter.fillRect(self.getCellRect(slot), QtCore.Qt.transparent)
+            painter.drawImage(self.getCellRect(slot).topLeft(), image)
+        painter.end()
+        # unique name, a file written by a session losing the table race is only pruned
+        fileName = "%s_%d_%s.png" % (
+            os.path.basename(self.basePath),
+            page,
+            uuid.uuid4().hex,
+        )
+        pagePath = os.path.join(os.path.dirname(self.basePath), fileName)
+        # the table is left as it was, it still names the previous files
+        if not pageImage.save(pagePath, "PNG"):
+            raise OSError("Could not write " + pagePath)
+        self.pages[page] = fileName
+
+
+class AtlasTask(QtCore.QRunnable):
+    """Read requested thumbnails of a folder from its atlas, only their pages are decoded"""
+
+    def __init__(self, atlas, callback, finishedCallback):
+        super(AtlasTask, self).__init__()
+        self.atlas = atlas
+        self.callback = callback
+        self.finishedCallback = finishedCallback
+        # thumbpaths requested and not read yet
+        self.keys = []
+        # set when the last keys were read, next ones go to a new task
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def addKey(self, thumbpath):
+        """Add a thumbnail to read, return False if the task does not take any more"""
+        with self._lock:
+            if self.closed:
+                return False
+            self.keys.append(thumbpath)
+            return True
+
+    def run(self):
+        try:
+            # thumbnails are checked against the catalog of the folder as it is now
+            with self.atlas.lock:
+                self.atlas.readItemMtimes()
+            while True:
+                # thumbnails requested while reading are read too
+                with self._lock:
+                    keys = self.keys
+                    self.keys = []
+                    if not keys:
+                        self.closed = True
+                        break
+                for thumbpath in keys:
+                    image = self.atlas.load(thumbpath)
+                    if image is not None:
+                        self.callback(thumbpath, image)
+        except Exception as e:
+            with self._lock:
+                self.closed = True
+            print(
+                "Info : Could not read atlas of "
+                + self.atlas.folderPath
+                + " : "
+                + str(e)
+            )
+        finally:
+            # thumbnails not found in the atlas are then loaded one by one
+            self.finishedCallback(self)
+
+
+class AtlasUpdateTask(QtCore.QRunnable):
+    """Add thumbnails loaded one by one to their folder atlas"""
+
+    def __init__(self, atlas, images):
+        super(AtlasUpdateTask, self).__init__()
+        self.atlas = atlas
+        self.images = images
+
+    def run(self):
+        try:
+            self.atlas.update(self.images)
+        except Exception as e:
+            print(
+                "Info : Could not update atlas of "
+                + self.atlas.folderPath
+                + " : "
+                + str(e)
+            )
@@ -1,20 +1,84 @@
+import threading
+import time
 from PySide6 import QtCore, QtGui, QtWidgets
 from collections import OrderedDict
 from gaolib.model.thumbnailtask import ThumbnailTask
+from gaolib.model.thumbnailatlas import (
+    AtlasTask,
+    AtlasUpdateTask,
+    ThumbnailAtlas,
+    getAtlasFolder,
+)
+
+# Memory budget of the cached pixmaps (thumbnailCacheMb in the settings)
+DEFAULT_CACHE_MB = 128
+# Time before a thumbnail which could not be loaded is tried again (s)
+FAILED_TTL = 30
+# Time gathering finished loads before they are stored at once (ms), about one frame
+BATCH_DELAY = 16
+# Threads decoding thumbnails, the global pool is left to other tasks
+THUMBNAIL_THREADS = 4
+# Queued loads of visible rows run before the prefetched ones
+VISIBLE_PRIORITY = 1
+PREFETCH_PRIORITY = 0
+# Atlases are written when no thumbnail is waiting
+ATLAS_UPDATE_PRIORITY = -1
+# Time gathering thumbnails loaded one by one before their atlas is written (ms)
+ATLAS_UPDATE_DELAY = 2000
 
 
 class ThumbnailCache(QtCore.QObject):
     _instance = None
-    thumbnailLoaded = QtCore.Signal(str)
+    # keys of the thumbnails stored in one batch
+    thumbnailsLoaded = QtCore.Signal(object)
+    # keys which load was dropped or failed, not loaded until requested again
+    thumbnailsDropped = QtCore.Signal(object)
+    # AtlasTask done, emitted from its thread
+    atlasRead = QtCore.Signal(object)
 
-    def __init__(self, max_kb=50000):
+    def __init__(self, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024, atlas_enabled=True):
         super().__init__(QtWidgets.QApplication.instance())
+        # key : pixmap, and (key, width, height, ratio) : pixmap scaled for a cell,
+        # both levels share the max_bytes budget and the LRU order
         self.cache = OrderedDict()
-        self.max_kb = max_kb
-        self.current_kb = 0
-        #
-        self.loading = set()
-        self.pool = QtCore.QThreadPool.globalInstance()
+        # key : its scaled keys in the cache
+        self.scaled_keys = {}
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key : time after which a thumbnail that could not be loaded is tried again
+        self.failed = {}
+        # key : ThumbnailTask queued or running
+        self.loading = {}
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(THUMBNAIL_THREADS)
+        # (key, image, from_atlas) decoded by the tasks, not stored yet
+        self.pending = []
+        self.pending_lock = threading.Lock()
+        self.batch_timer = QtCore.QTimer(self)
+        self.batch_timer.setSingleShot(True)
+        self.batch_timer.setInterval(BATCH_DELAY)
+        self.batch_timer.timeout.connect(self._flush)
+        # thumbnails of a folder are read from its atlas, requested ones only
+        self.atlas_enabled = atlas_enabled
+        # folder : ThumbnailAtlas, its table is read once
+        self.atlases = {}
+        # folder : AtlasTask queued or running
+        self.atlas_tasks = {}
+        # keys missing or outdated in their atlas, loaded one by one until it is updated
+        self.atlas_missing = set()
+        self.atlasRead.connect(self._atlas_done)
+        # folder : {key : image} loaded one by one, to be added to its atlas
+        self.atlas_updates = {}
+        self.atlas_timer = QtCore.QTimer(self)
+        self.atlas_timer.setSingleShot(True)
+        self.atlas_timer.setInterval(ATLAS_UPDATE_DELAY)
+        self.atlas_timer.timeout.connect(self._update_atlases)
+        # function returning the catalog of a path, atlases check their thumbnails
+        # against the item mtimes it holds
+        self.find_catalog = None
 
     @classmethod
     def instance(cls):
@@ -22,19 +86,59 @@ class ThumbnailCache(QtCore.QObject):
             cls._instance = cls()
         return cls._instance
 
-    def _pixmap_size(self, pixmap):
-        return pixmap.width() * pixmap.height() * 4 // 1024
+    def _pixmap_bytes(self, pixmap):
+        # size in device pixels (devicePixelRatio included), depth of its format
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+    def setMaxBytes(self, max_bytes):
+        """Set memory budget, least recently used pixmaps are dropped to fit in"""
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def setCatalogFinder(self, find_catalog):
+        """Set function returning the catalog of a path, None if not in a library"""
+        self.find_catalog = find_catalog
+
+    def stats(self):
+        """Return dict of cache counters, for debugging and settings"""
+        return {
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "entries": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "failed": len(self.failed),
+        }
 
     def insert(self, key, pixmap):
-        size = self._pixmap_size(pixmap)
+        size = self._pixmap_bytes(pixmap)
         if key in self.cache:
-            old = self.cache.pop(key)
-            self.current_kb -= self._pixmap_size(old)
+            self._remove(key)
+        if isinstance(key, str):
+            # scaled pixmaps of a reloaded thumbnail are outdated
+            for scaled_key in list(self.scaled_keys.get(key, [])):
+                self._remove(scaled_key)
+        else:
+            self.scaled_keys.setdefault(key[0], set()).add(key)
         self.cache[key] = pixmap
-        self.current_kb += size
-        while self.current_kb > self.max_kb:
-            k, v = self.cache.popitem(last=False)
-            self.current_kb -= self._pixmap_size(v)
+        self.current_bytes += size
+        self._evict()
+
+    def _evict(self):
+        # the last inserted pixmap is kept, even alone above the budget
+        while self.current_bytes > self.max_bytes and len(self.cache) > 1:
+            self._remove(next(iter(self.cache)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        pixmap = self.cache.pop(key)
+        self.current_bytes -= self._pixmap_bytes(pixmap)
+        if not isinstance(key, str):
+            scaled_keys = self.scaled_keys[key[0]]
+            scaled_keys.discard(key)
+            if not scaled_keys:
+                del self.scaled_keys[key[0]]
 
     def find(self, key):
         pixmap = self.cache.get(key)
@@ -42,31 +146,189 @@ class ThumbnailCache(QtCore.QObject):
             self.cache.move_to_end(key)
         return pixmap
 
-    def request(self, key):
+    def request(self, key, priority=VISIBLE_PRIORITY):
         pixmap = self.cache.get(key)
         if pixmap:
             self.cache.move_to_end(key)
+            self.hits += 1
             return pixmap
 
-        if key not in self.loading:
-            self.loading.add(key)
-            task = ThumbnailTask(key, self._on_loaded)
-            self.pool.start(task)
+        if key not in self.loading and not self._has_failed(key):
+            self.misses += 1
+            self._start(key, priority)
 
         return None
 
-    def _on_loaded(self, key, image):
-        QtCore.QMetaObject.invokeMethod(
-            self,
-            "_store",
-            QtCore.Qt.QueuedConnection,
-            QtCore.Q_ARG(str, key),
-            QtCore.Q_ARG(QtGui.QImage, image),
+    def isLoading(self, key):
+        """Return True if thumbnail of given key is queued or being loaded"""
+        return key in self.loading
+
+    def _has_failed(self, key):
+        retry_time = self.failed.get(key)
+        if retry_time is None:
+            return False
+        if time.monotonic() < retry_time:
+            return True
+        del self.failed[key]
+        return False
+
+    def _start(self, key, priority):
+        folder = getAtlasFolder(key) if self.atlas_enabled else None
+        if folder is not None and key not in self.atlas_missing:
+            task = self.atlas_tasks.get(folder)
+            # a running read takes the thumbnails requested until it is done
+            if task is None or not task.addKey(key):
+                atlas = self.atlases.get(folder)
+                if atlas is None:
+                    atlas = self.atlases[folder] = ThumbnailAtlas(
+                        folder, self.find_catalog
+                    )
+                task = AtlasTask(atlas, self._on_atlas_loaded, self.atlasRead.emit)
+                task.addKey(key)
+                task.priority = priority
+                task.setAutoDelete(False)
+                self.atlas_tasks[folder] = task
+                self.pool.start(task, priority)
+            self.loading[key] = task
+            return
+        # thumbnails missing in their atlas are added to it, not to the disk cache
+        task = ThumbnailTask(key, self._on_loaded, useDiskCache=folder is None)
+        task.priority = priority
+        # kept alive until loaded, tryTake may be called on it
+        task.setAutoDelete(False)
+        self.loading[key] = task
+        self.pool.start(task, priority)
+
+    def prefetch(self, visible_keys, prefetch_keys):
+        """Load visible thumbnails first, then prefetched ones, drop other queued loads"""
+        wanted = {}
+        for key in prefetch_keys:
+            wanted[key] = PREFETCH_PRIORITY
+        for key in visible_keys:
+            wanted[key] = VISIBLE_PRIORITY
+        dropped = []
+        task_keys = {}
+        for key, task in self.loading.items():
+            task_keys.setdefault(id(task), (task, []))[1].append(key)
+        for task, keys in task_keys.values():
+            if isinstance(task, AtlasTask):
+                # one read for thumbnails of a folder, kept while one of them is wanted
+                if any(key in wanted for key in keys):
+                    continue
+            elif wanted.get(keys[0]) == task.priority:
+                continue
+            # tasks not started yet are dropped, or queued again with their new priority
+            if self.pool.tryTake(task):
+                for key in keys:
+                    del self.loading[key]
+                    if key not in wanted:
+                        dropped.append(key)
+                if isinstance(task, AtlasTask):
+                    del self.atlas_tasks[task.atlas.folderPath]
+        for key, priority in wanted.items():
+            if (
+                key not in self.loading
+                and key not in self.cache
+                and not self._has_failed(key)
+            ):
+                self._start(key, priority)
+        if dropped:
+            self.thumbnailsDropped.emit(dropped)
+
+    def requestScaled(self, key, size, ratio=1.0):
+        """Return thumbnail fitted in size (QSize) for given device pixel ratio"""
+        scaled_key = (key, size.width(), size.height(), ratio)
+        scaled = self.cache.get(scaled_key)
+        if scaled:
+            self.cache.move_to_end(scaled_key)
+            self.hits += 1
+            return scaled
+        pixmap = self.request(key)
+        if not pixmap:
+            return None
+        # scaled once per cell size, next paints only draw it
+        scaled = pixmap.scaled(
+            size * ratio,
+            QtCore.Qt.KeepAspectRatio,
+            QtCore.Qt.SmoothTransformation,
         )
+        scaled.setDevicePixelRatio(ratio)
+        self.insert(scaled_key, scaled)
+        return scaled
+
+    def _on_loaded(self, key, image):
+        self._push(key, image, False)
+
+    def _on_atlas_loaded(self, key, image):
+        self._push(key, image, True)
+
+    def _push(self, key, image, from_atlas):
+        # called by the tasks, only the first result of a batch wakes the GUI thread
+        with self.pending_lock:
+            self.pending.append((key, image, from_atlas))
+            first = len(self.pending) == 1
+        if first:
+            QtCore.QMetaObject.invokeMethod(
+                self, "_schedule_flush", QtCore.Qt.QueuedConnection
+            )
 
-    @QtCore.Slot(str, QtGui.QImage)
-    def _store(self, key, image):
+    @QtCore.Slot()
+    def _schedule_flush(self):
+        # results finishing meanwhile join the batch
+        if not self.batch_timer.isActive():
+            self.batch_timer.start()
+
+    def _flush(self):
+        with self.pending_lock:
+            pending = self.pending
+            self.pending = []
+        keys = []
+        failed = []
+        for key, image, from_atlas in pending:
+            if self._store(key, image, from_atlas):
+                keys.append(key)
+            else:
+                failed.append(key)
+        if keys:
+            self.thumbnailsLoaded.emit(keys)
+        if failed:
+            self.thumbnailsDropped.emit(failed)
+
+    def _store(self, key, image, from_atlas):
+        self.loading.pop(key, None)
+        if image.isNull():
+            # not requested again until FAILED_TTL is over
+            print("Info : Could not load thumbnail " + key)
+            self.failed[key] = time.monotonic() + FAILED_TTL
+            return False
+        self.failed.pop(key, None)
         pixmap = QtGui.QPixmap.fromImage(image)
         self.insert(key, pixmap)
-        self.loading.discard(key)
-        self.thumbnailLoaded.emit(key)
+        if self.atlas_enabled and not from_atlas:
+            folder = getAtlasFolder(key)
+            if folder is not None:
+                self.atlas_updates.setdefault(folder, {})[key] = image
+                self.atlas_timer.start()
+        return True
+
+    def _atlas_done(self, task):
+        # thumbnails read from the atlas are stored before the missing ones are looked for
+        self._flush()
+        folder = task.atlas.folderPath
+        if self.atlas_tasks.get(folder) is task:
+            del self.atlas_tasks[folder]
+        # thumbnails missing or outdated in the atlas are loaded one by one
+        for key, loading_task in list(self.loading.items()):
+            if loading_task is task:
+                del self.loading[key]
+                self.atlas_missing.add(key)
+                self._start(key, task.priority)
+
+    def _update_atlases(self):
+        for folder, images in self.atlas_updates.items():
+            # read from the atlas again, a read before the update loads them again
+            self.atlas_missing.difference_update(images.keys())
+            self.pool.start(
+                AtlasUpdateTask(self.atlases[folder], images), ATLAS_UPDATE_PRIORITY
+            )
+        self.atlas_updates = {}
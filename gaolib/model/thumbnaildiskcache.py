@@ -0,0 +1,161 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+import hashlib
+import os
+import threading
+import time
+
+from PySide6 import QtGui
+
+# Size of a cache folder above which least recently used files are deleted
+MAX_CACHE_MB = 512
+# Used files are touched at most once a day, atime is often not updated on shares
+TOUCH_INTERVAL = 24 * 3600
+
+
+class ThumbnailDiskCache(object):
+    """Scaled thumbnails saved on disk, so next sessions do not decode the full images"""
+
+    _instance = None
+
+    def __init__(self):
+        self.localFolder = os.path.join(
+            os.path.expanduser("~"), "blenderTemp", "gaolib_config", "thumbs"
+        )
+        # ROOT path : its shared cache folder (None if not usable), found once per ROOT
+        self.sharedFolders = {}
+        # cache folders already pruned in this session
+        self.prunedFolders = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def getSharedFolder(self, rootPath):
+        """Return ROOT/.gaolib/thumbs folder if the ROOT catalog folder is writable"""
+        with self._lock:
+            if rootPath not in self.sharedFolders.keys():
+                gaolibFolder = os.path.join(rootPath, ".gaolib")
+                sharedFolder = None
+                # .gaolib is created by the catalog of the ROOT, when writable
+                if os.path.isdir(gaolibFolder) and os.access(gaolibFolder, os.W_OK):
+                    sharedFolder = os.path.join(gaolibFolder, "thumbs")
+                self.sharedFolders[rootPath] = sharedFolder
+            return self.sharedFolders[rootPath]
+
+    def getCacheFolder(self, sourcePath):
+        """Return the shared cache folder of the ROOT of sourcePath, else the local one"""
+        parts = os.path.normpath(sourcePath).split(os.sep)
+        for i in reversed(range(len(parts) - 1)):
+            if parts[i] == "ROOT":
+                sharedFolder = self.getSharedFolder(os.sep.join(parts[: i + 1]))
+                if sharedFolder is not None:
+                    return sharedFolder
+        return self.localFolder
+
+    def getCachePath(self, sourcePath, size):
+        """Return cache file path of sourcePath scaled to size, None if source is missing"""
+        try:
+            stat = os.stat(sourcePath)
+        except OSError:
+            return None
+        # a modified source gets a new key, its old scaled image is not used anymore
+        key = "%s|%s|%d|%d" % (
+            os.path.normcase(os.path.realpath(sourcePath)),
+            stat.st_mtime,
+            stat.st_size,
+            size,
+        )
+        fileName = hashlib.md5(key.encode("utf-8")).hexdigest() + ".png"
+        return os.path.join(self.getCacheFolder(sourcePath), fileName[:2], fileName)
+
+    def load(self, sourcePath, size):
+        """Return the cached QImage of sourcePath scaled to size, None if not cached"""
+        cachePath = self.getCachePath(sourcePath, size)
+        if cachePath is None:
+            return None
+        try:
+            stat = os.stat(cachePath)
+        except OSError:
+            return None
+        image = QtGui.QImage(cachePath)
+        if image.isNull():
+            return None
+        if time.time() - stat.st_mtime > TOUCH_INTERVAL:
+            # used files are the last ones pruned
+            try:
+                os.utime(cachePath)
+            except OSError:
+                pass
+        return image
+
+    def store(self, sourcePath, size, image):
+        """Save image, sourcePath scaled to size, in the cache"""
+        cachePath = self.getCachePath(sourcePath, size)
+        if cachePath is None or image.isNull():
+            return
+        self.pruneOnce(os.path.dirname(os.path.dirname(cachePath)))
+        # written aside then renamed, other threads and sessions never read a partial file
+        tempPath = "%s.%d.%d.tmp" % (cachePath, os.getpid(), threading.get_ident())
+        try:
+            if not os.path.isdir(os.path.dirname(cachePath)):
+                os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+            if image.save(tempPath, "PNG"):
+                os.replace(tempPath, cachePath)
+        except OSError as e:
+            print("Info : Could not cache thumbnail of " + sourcePath + " : " + str(e))
+
+    def pruneOnce(self, cacheFolder):
+        """Prune given cache folder, the first time something is stored in it"""
+        with self._lock:
+            if cacheFolder in self.prunedFolders:
+                return
+            self.prunedFolders.add(cacheFolder)
+        self.prune(cacheFolder)
+
+    def prune(self, cacheFolder, maxBytes=MAX_CACHE_MB * 1024 * 1024):
+        """Delete least recently used files of cacheFolder until it fits in maxBytes"""
+        files = []
+        totalBytes = 0
+        for dirPath, dirNames, fileNames in os.walk(cacheFolder):
+            for fileName in fileNames:
+                path = os.path.join(dirPath, fileName)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                # images of modified thumbnails are never used again, so never touched
+                files.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+                totalBytes += stat.st_size
+        if totalBytes <= maxBytes:
+            return
+        files.sort()
+        # some room is made, the folder is not full again at once
+        for usedTime, size, path in files:
+            if totalBytes <= maxBytes * 0.8:
+                break
+            try:
+                os.remove(path)
+                totalBytes -= size
+            except OSError:
+                pass
@@ -0,0 +1,104 @@
+#   Copyright (C) 2022 GAO SHAN PICTURES
+
+#   This file is a part of GAOLIB.
+
+#   GAOLIB is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>
+
+__author__ = "Anne Beurard"
+
+from PySide6 import QtCore
+
+import gaolib.model.thumbnailcache as thc
+from gaolib.model.gaoliblistmodel import RecordRole
+
+# Time without scrolling before the loads are scheduled again (ms)
+PREFETCH_DELAY = 30
+
+
+class ThumbnailPrefetcher(QtCore.QObject):
+    """Load thumbnails of the visible rows of a list view, then of the next screen"""
+
+    def __init__(self, view, parent=None):
+        super(ThumbnailPrefetcher, self).__init__(parent)
+        self.view = view
+        self.scrollValue = 0
+        # 1 when scrolling down, -1 when scrolling up
+        self.scrollDirection = 1
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(PREFETCH_DELAY)
+        self.timer.timeout.connect(self.updateRequests)
+        scrollBar = view.verticalScrollBar()
+        scrollBar.valueChanged.connect(self.onScrolled)
+        # layout changes, including viewport resizes
+        scrollBar.rangeChanged.connect(self.schedule)
+        model = view.model()
+        for signal in [
+            model.rowsInserted,
+            model.rowsRemoved,
+            model.layoutChanged,
+            model.modelReset,
+        ]:
+            signal.connect(self.schedule)
+
+    def schedule(self, *args):
+        """Update the loads when the view settles (signal arguments are ignored)"""
+        self.timer.start()
+
+    def onScrolled(self, value):
+        """Remember scroll direction, next screen is prefetched in this direction"""
+        if value != self.scrollValue:
+            self.scrollDirection = 1 if value > self.scrollValue else -1
+        self.scrollValue = value
+        self.schedule()
+
+    def getVisibleRows(self):
+        """Return first row and row after the last one displayed in the viewport"""
+        model = self.view.model()
+        count = model.rowCount()
+        height = self.view.viewport().height()
+        # rows are laid out from top to bottom, find the first visible one by dichotomy
+        first = 0
+        last = count
+        while first < last:
+            middle = (first + last) // 2
+            if self.view.visualRect(model.index(middle, 0)).bottom() < 0:
+                first = middle + 1
+            else:
+                last = middle
+        last = first
+        while (
+            last < count and self.view.visualRect(model.index(last, 0)).top() < height
+        ):
+            last += 1
+        return first, last
+
+    def getThumbnailPaths(self, rows):
+        """Return thumbnail paths of given rows of the view"""
+        model = self.view.model()
+        return [model.index(row, 0).data(RecordRole).thumbpath for row in rows]
+
+    def updateRequests(self):
+        """Load visible thumbnails, then the next screen, drop the other queued loads"""
+        first, last = self.getVisibleRows()
+        count = self.view.model().rowCount()
+        screenRows = max(last - first, 1)
+        if self.scrollDirection > 0:
+            prefetchRows = range(last, min(last + screenRows, count))
+        else:
+            prefetchRows = range(max(first - screenRows, 0), first)
+        thc.ThumbnailCache.instance().prefetch(
+            self.getThumbnailPaths(range(first, last)),
+            self.getThumbnailPaths(prefetchRows),
+        )
@@ -1,12 +1,19 @@
 import os
 from PySide6 import QtCore, QtGui
+from gaolib.model.thumbnaildiskcache import ThumbnailDiskCache
+
+# Size of the thumbnails displayed in the list view
+THUMBNAIL_SIZE = 200
 
 
 class ThumbnailTask(QtCore.QRunnable):
-    def __init__(self, path, callback):
+
+    def __init__(self, path, callback, useDiskCache=True):
         super().__init__()
         self.path = path
         self.callback = callback
+        # thumbnails kept in their folder atlas are not cached a second time
+        self.useDiskCache = useDiskCache
 
     def run(self):
         # return the nopreview image if the thumbnail does not exist
@@ -15,12 +22,24 @@ class ThumbnailTask(QtCore.QRunnable):
                 os.path.dirname(os.path.realpath(__file__)),
                 "../icons/nopreview2.png",
             )
-            image = QtGui.QImage(noPreviewPath)
+            image = self.scale(QtGui.QImage(noPreviewPath))
+        elif not self.useDiskCache:
+            image = self.scale(QtGui.QImage(self.path))
         else:
-            image = QtGui.QImage(self.path)
-        # scale it for performance
-        image = image.scaled(
-            200, 200, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation
-        )
+            # scaled image saved by a previous session
+            diskCache = ThumbnailDiskCache.instance()
+            image = diskCache.load(self.path, THUMBNAIL_SIZE)
+            if image is None:
+                image = self.scale(QtGui.QImage(self.path))
+                diskCache.store(self.path, THUMBNAIL_SIZE, image)
 
         self.callback(self.path, image)
+
+    def scale(self, image):
+        # scale it for performance
+        return image.scaled(
+            THUMBNAIL_SIZE,
+            THUMBNAIL_SIZE,
+            QtCore.Qt.KeepAspectRatio,
+            QtCore.Qt.SmoothTransformation,
+        )
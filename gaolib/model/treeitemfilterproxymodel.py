@@ -19,6 +19,9 @@ __author__ = "Anne Beurard"
 
 from PySide6 import QtCore
 
+from gaolib.model.gaolibfuzzymatcher import normalizeName
+from gaolib.model.gaolibtreefilter import GaoLibTreeFilter
+
 
 class TreeItemFilterProxyModel(QtCore.QSortFilterProxyModel):
     """Filter model for tree items"""
@@ -26,29 +29,54 @@ class TreeItemFilterProxyModel(QtCore.QSortFilterProxyModel):
     def __init__(self, parent=None):
         super(TreeItemFilterProxyModel, self).__init__(parent)
         self.text = ""
+        self.treeFilter = GaoLibTreeFilter()
+
+    def setSourceModel(self, sourceModel):
+        """Set source model, the name index follows its inserted and removed rows"""
+        self.treeFilter.clear()
+        # connected before the proxy, so the index is updated when rows are filtered
+        sourceModel.rowsInserted.connect(self.onRowsInserted)
+        sourceModel.rowsAboutToBeRemoved.connect(self.onRowsAboutToBeRemoved)
+        # names never change with dataChanged, other changes rebuild the index
+        for signal in [
+            sourceModel.rowsMoved,
+            sourceModel.layoutChanged,
+            sourceModel.modelReset,
+        ]:
+            signal.connect(self.treeFilter.clear)
+        super(TreeItemFilterProxyModel, self).setSourceModel(sourceModel)
+
+    def getSourceItems(self, parent, first, last):
+        """Return source tree items of given rows of parent"""
+        parentElem = self.sourceModel().getElement(parent)
+        return [
+            parentElem.child(row)
+            for row in range(first, min(last + 1, parentElem.childCount()))
+        ]
 
-    # Recursive search
-    def _accept_index(self, idx):
-        """Accept items which display role contains given filter text"""
-        if idx.isValid():
-            text = idx.data(role=QtCore.Qt.DisplayRole).lower()
-            condition = text.find(self.text) >= 0
+    def onRowsInserted(self, parent, first, last):
+        """Index the names of the inserted items"""
+        self.treeFilter.addItems(self.getSourceItems(parent, first, last))
 
-            if condition:
-                return True
-            for childnum in range(idx.model().rowCount(parent=idx)):
-                if self._accept_index(idx.model().index(childnum, 0, parent=idx)):
-                    return True
+    def onRowsAboutToBeRemoved(self, parent, first, last):
+        """Forget the items about to be removed, while they are still in the tree"""
+        self.treeFilter.removeItems(self.getSourceItems(parent, first, last))
 
-        return False
+    def setFilterText(self, text):
+        """Filter tree with given text"""
+        self.text = normalizeName(text)
+        self.invalidateFilter()
 
     def filterAcceptsRow(self, sourceRow, sourceParent):
-        # Only first column in model for search
-        idx = self.sourceModel().index(sourceRow, 0, sourceParent)
-        return self._accept_index(idx)
-
-    def lessThan(self, left, right):
-        """Items comparator"""
-        leftData = self.sourceModel().data(left).lower()
-        rightData = self.sourceModel().data(right).lower()
-        return leftData < rightData
+        """Accept items which name is similar to filter text, or with such a descendant"""
+        if not self.text:
+            return True
+        sourceModel = self.sourceModel()
+        parentElem = sourceModel.getElement(sourceParent)
+        if sourceRow >= parentElem.childCount():
+            return False
+        # computed once per text for the whole tree
+        acceptedItems = self.treeFilter.getAcceptedItems(
+            sourceModel.getElement(QtCore.QModelIndex()), self.text
+        )
+        return parentElem.child(sourceRow) in acceptedItems